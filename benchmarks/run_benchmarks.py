@@ -0,0 +1,279 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from create_dataset import DataMaker, DatasetParser, make_messages
+from evaluate_fine_tune_model_v2 import Config, EvaluationRunner
+from prep_and_analisys_dataset import DatasetAnalyzer
+from src.lib.embed.ann import IVFIndex
+from src.lib.embed.labse import LaBSEEmbedder
+from src.lib.eval.results_store import ResultsStore
+from src.lib.finetune.fake_api import FakeOpenAI
+from src.lib.store.experiments import ExperimentStore
+
+EN_WORDS = (
+    "the cat sat on a warm mat while rain fell over quiet city streets and old friends "
+    "talked about books music travel and the long winter night"
+).split()
+JA_CHARS = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん猫雨町本音楽旅冬夜友話"
+SYSTEM = "You are an expert literary English-Japanese translator."
+
+
+def synthetic_pairs(n, seed=0):
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n):
+        en = " ".join(rng.choice(EN_WORDS) for _ in range(rng.randint(5, 30))) + "."
+        ja = "".join(rng.choice(JA_CHARS) for _ in range(rng.randint(10, 60))) + "。"
+        pairs.append((en, ja))
+    return pairs
+
+
+class SyntheticParser(DatasetParser):
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+    def parse(self, index):
+        return self.pairs[index]
+
+    def data_length(self):
+        return len(self.pairs)
+
+
+def build_tiny_bert(model_dir, seed=0):
+    """Save a randomly initialised 2-layer BERT and a character vocab, loadable by LaBSEEmbedder."""
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    torch.manual_seed(seed)
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted(set(EN_WORDS) | set(JA_CHARS) | set(".。"))
+    vocab_file = os.path.join(model_dir, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab) + "\n")
+    BertTokenizerFast(vocab_file=vocab_file).save_pretrained(model_dir)
+    config = BertConfig(
+        vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2,
+        num_attention_heads=2, intermediate_size=128, max_position_embeddings=512,
+    )
+    BertModel(config).save_pretrained(model_dir)
+    return model_dir
+
+
+def timed(fn):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    return time.perf_counter() - start, result
+
+
+def bench_data_maker(model_dir, workdir, n_rows):
+    config = {
+        "system": SYSTEM, "user": "{text}", "similarity": -1.0, "japanese_ratio": 0.0,
+        "embedding_model": model_dir, "progress_interval": 1e9,
+    }
+    data_maker = DataMaker(config, SyntheticParser(synthetic_pairs(n_rows, seed=1)))
+    output_file = os.path.join(workdir, "data_maker.jsonl")
+    seconds, _ = timed(lambda: data_maker.create_dataset(config, output_file, 0, n_rows))
+    return {"rows": n_rows, "seconds": seconds, "rows_per_sec": n_rows / seconds}
+
+
+def bench_embedder(model_dir, n_texts, batch_sizes):
+    embedder = LaBSEEmbedder(model_dir)
+    texts = [en for en, _ in synthetic_pairs(n_texts, seed=2)]
+    results = {}
+    for batch_size in batch_sizes:
+        def run():
+            for start in range(0, n_texts, batch_size):
+                batch = texts[start : start + batch_size]
+                if batch_size == 1:
+                    embedder.get_embedding(batch[0])
+                else:
+                    embedder.get_embeddings(batch)
+        seconds, _ = timed(run)
+        results[str(batch_size)] = {"texts": n_texts, "seconds": seconds, "texts_per_sec": n_texts / seconds}
+    return results
+
+
+def synthetic_examples(n_rows):
+    return [make_messages(SYSTEM, "{text}", en, ja) for en, ja in synthetic_pairs(n_rows, seed=3)]
+
+
+def write_jsonl(path, examples):
+    with open(path, "w", encoding="utf-8") as f:
+        for example in examples:
+            f.write(json.dumps(example, ensure_ascii=False) + "\n")
+
+
+def bench_analyzer(workdir, n_rows):
+    path = os.path.join(workdir, "analyzer.jsonl")
+    write_jsonl(path, synthetic_examples(n_rows))
+    seconds, _ = timed(lambda: DatasetAnalyzer(path).run_analysis())
+    return {"rows": n_rows, "seconds": seconds, "rows_per_sec": n_rows / seconds}
+
+
+def bench_jsonl_io(workdir, n_rows):
+    path = os.path.join(workdir, "io.jsonl")
+    examples = synthetic_examples(n_rows)
+    write_seconds, _ = timed(lambda: write_jsonl(path, examples))
+    size_mb = os.path.getsize(path) / 1e6
+
+    def read():
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    read_seconds, _ = timed(read)
+    return {
+        "rows": n_rows,
+        "mb": size_mb,
+        "write_mb_per_sec": size_mb / write_seconds,
+        "read_mb_per_sec": size_mb / read_seconds,
+    }
+
+
+def bench_evaluation_runner(workdir, n_pairs, latency):
+    path = os.path.join(workdir, "eval_pairs.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for en, ja in synthetic_pairs(n_pairs, seed=4):
+            f.write(json.dumps({"en": en, "ja": ja}, ensure_ascii=False) + "\n")
+    config = Config.from_dict({
+        "dataset": path, "system": SYSTEM, "user": "{text}", "epoch": 1,
+        "models": ["gpt-4o-mini-2024-07-18", "ft:gpt-4o-mini-2024-07-18:bench::abc"],
+        "output_file": os.path.join(workdir, "eval_results.json"),
+    })
+    client = FakeOpenAI(latency=latency)
+    # 実際の config/experiments.db と config/results を汚さないよう、一時ディレクトリのストアに保存する
+    store = ExperimentStore(os.path.join(workdir, "experiments.db"))
+    results_store = ResultsStore(os.path.join(workdir, "results"), store)
+    runner = EvaluationRunner(config, client, anthropic_client=client, results_store=results_store)
+    seconds, _ = timed(runner.run)
+    # 1 ペアあたり補完 1 回 + 埋め込み 2 回
+    calls = n_pairs * len(config.get("models")) * 3
+    return {"calls": calls, "latency": latency, "seconds": seconds, "calls_per_sec": calls / seconds}
+
+
+def bench_ann_index(n_vectors, dim, n_queries=1000, radius=0.05, seed=0):
+    """Build an IVFIndex of random unit vectors and query near duplicates (cosine 0.96) of indexed ones."""
+    rng = np.random.default_rng(seed)
+    index = IVFIndex(dim)
+    kept = []
+    step = max(n_vectors // n_queries, 1)
+
+    def build():
+        for start in range(0, n_vectors, 10000):
+            batch = rng.standard_normal((min(10000, n_vectors - start), dim)).astype(np.float32)
+            kept.extend(batch[::step].copy())
+            for vector in batch:
+                index.add(vector)
+
+    build_seconds, _ = timed(build)
+    kept = np.array(kept[:n_queries])
+    kept /= np.linalg.norm(kept, axis=1, keepdims=True)
+    noise = rng.standard_normal(kept.shape).astype(np.float32)
+    noise /= np.linalg.norm(noise, axis=1, keepdims=True)
+    queries = kept * 0.96 + noise * np.sqrt(1 - 0.96 ** 2)
+    query_seconds, hits = timed(lambda: sum(index.has_neighbor_within(q, radius) for q in queries))
+    return {
+        "vectors": n_vectors,
+        "dim": dim,
+        "lists": index.nlist,
+        "adds_per_sec": n_vectors / build_seconds,
+        "query_ms": query_seconds / len(queries) * 1e3,
+        "queries_per_sec": len(queries) / query_seconds,
+        "recall": hits / len(queries),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_all(args):
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "params": vars(args),
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        model_dir = build_tiny_bert(os.path.join(workdir, "tiny_bert"))
+        suite = {
+            "data_maker": lambda: bench_data_maker(model_dir, workdir, args.rows),
+            "labse_embedder": lambda: bench_embedder(model_dir, args.texts, args.batch_sizes),
+            # DatasetAnalyzer は tiktoken の cl100k_base を使うため、事前にキャッシュしておく必要がある
+            "dataset_analyzer": lambda: bench_analyzer(workdir, args.rows * 10),
+            "jsonl_io": lambda: bench_jsonl_io(workdir, args.rows * 10),
+            "evaluation_runner": lambda: bench_evaluation_runner(workdir, args.pairs, args.latency),
+            "ann_index": lambda: bench_ann_index(args.ann_size, args.ann_dim),
+        }
+        for name, bench in suite.items():
+            try:
+                results["benchmarks"][name] = bench()
+            except Exception as e:
+                print(f"{name} failed: {e!r}")
+                results["benchmarks"][name] = {"error": repr(e)}
+    return results
+
+
+def flatten(prefix, value):
+    if isinstance(value, dict):
+        for key, inner in value.items():
+            yield from flatten(f"{prefix}.{key}" if prefix else key, inner)
+    elif isinstance(value, (int, float)) and ("per_sec" in prefix):
+        yield prefix, value
+
+
+def compare(old_path, new_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = dict(flatten("", json.load(f)["benchmarks"]))
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = dict(flatten("", json.load(f)["benchmarks"]))
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key] / old[key] if old[key] else float("inf")
+        flag = "  REGRESSION" if ratio < 0.9 else ""
+        print(f"{key}: {old[key]:.1f} -> {new[key]:.1f} ({ratio:.2f}x){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the dataset and evaluation pipelines")
+    parser.add_argument("--rows", type=int, default=500, help="Rows for DataMaker (x10 for analyzer and JSONL I/O)")
+    parser.add_argument("--texts", type=int, default=512, help="Texts for the embedder benchmark")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--pairs", type=int, default=50, help="Evaluation pairs per model")
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated API latency in seconds")
+    parser.add_argument("--ann-size", type=int, default=100000, help="Vectors in the diversity index benchmark")
+    parser.add_argument("--ann-dim", type=int, default=768, help="Vector size for the diversity index (LaBSE: 768)")
+    parser.add_argument("--output-dir", default="benchmarks/results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run_all(args)
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_file = os.path.join(
+        args.output_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['commit']}.json"
+    )
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(json.dumps(results["benchmarks"], indent=2))
+    print(f"Results written to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import sys
+
+from src.lib.eval.results_store import PairComparison, ResultsStore
+
+
+def list_runs(results_store, args):
+    rows = results_store.runs(args.model, args.dataset)
+    if not rows:
+        print("(none)")
+        return
+    for row in rows:
+        avg_score = f"{row['avg_score']:.4f}" if row["avg_score"] is not None else "-"
+        print(f"{row['run']}  {row['model']}  {avg_score}  n={row['n_scores']}  {row['dataset']}")
+
+
+def compare_runs(results_store, args):
+    old_run = results_store.resolve(args.old, args.old_model or args.new_model, args.dataset)
+    new_run = results_store.resolve(args.new, args.new_model or args.old_model, args.dataset)
+    old = results_store.load(old_run)
+    new = results_store.load(new_run)
+    if args.old_model or args.new_model:
+        model_pairs = [(args.old_model or args.new_model, args.new_model or args.old_model)]
+    else:
+        model_pairs = [(model, model) for model in new.models if model in old.models]
+        if not model_pairs:
+            raise ValueError(f"Runs {old_run} and {new_run} have no model in common; pass --old-model/--new-model.")
+
+    print(f"{old_run} -> {new_run}")
+    report = []
+    for old_model, new_model in model_pairs:
+        comparison = PairComparison(old, old_model, new, new_model, args.threshold)
+        summary = comparison.summary()
+        summary["worst"] = comparison.worst(args.top)
+        report.append(summary)
+        label = old_model if old_model == new_model else f"{old_model} -> {new_model}"
+        flag = "  REGRESSION" if summary["regression"] else ""
+        print(
+            f"{label}: {summary['old_mean']:.4f} -> {summary['new_mean']:.4f} "
+            f"({summary['mean_delta']:+.4f} ± {summary['stderr']:.4f}, {summary['pairs']} pairs, "
+            f"{summary['regressed']} regressed / {summary['improved']} improved by > {args.threshold}){flag}"
+        )
+        for pair in summary["worst"]:
+            print(f"    {pair['delta']:+.4f}  {pair['old']:.4f} -> {pair['new']:.4f}  {pair['en'][:80]}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"old": old_run, "new": new_run, "models": report}, f, indent=2, ensure_ascii=False)
+        print(f"Comparison written to {args.output}")
+    if args.fail_on_regression and any(summary["regression"] for summary in report):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-pair scores of stored evaluation runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List stored runs")
+    list_parser.add_argument("--model", help="Only runs that evaluated this model")
+    list_parser.add_argument("--dataset", help="Only runs on this evaluation dataset")
+
+    compare_parser = subparsers.add_parser("compare", help="Per-pair score deltas between two runs")
+    compare_parser.add_argument("old", help='Baseline run id, or "latest" / "previous"')
+    compare_parser.add_argument("new", help='Run id to compare, or "latest" / "previous"')
+    compare_parser.add_argument("--old-model", help="Model in the baseline run (default: every common model)")
+    compare_parser.add_argument("--new-model", help="Model in the new run (default: same as --old-model)")
+    compare_parser.add_argument("--dataset", help='Dataset used to resolve "latest" / "previous"')
+    compare_parser.add_argument("--threshold", type=float, default=0.05, help="Per-pair delta counted as a regression")
+    compare_parser.add_argument("--top", type=int, default=10, help="Worst pairs to show per model")
+    compare_parser.add_argument("--output", help="Write the comparison to this JSON file")
+    compare_parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    results_store = ResultsStore()
+    if args.command == "list":
+        list_runs(results_store, args)
+    else:
+        compare_runs(results_store, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,15 @@ import os
 import sys
 from abc import ABC, abstractmethod
 import re
+import numpy as np
 from src.lib.embed.labse import LaBSEEmbedder
+from src.lib.embed.ann import IVFIndex
+from src.lib.metrics import Metrics, ProgressReporter
+from src.lib.text.script import classify_scripts
+from src.lib.dataset.ledger import ScoreLedger
+from src.lib.dataset.budget import TrainingExampleWriter
+from src.lib.dataset.splits import DatasetSplitter, SplitWriter
+from src.lib.store.experiments import default_store
 from prep_and_analisys_dataset import DatasetAnalyzer
 from typing import Tuple
 from datetime import datetime
@@ -83,12 +91,12 @@ def get_parser(dataset_name):
         raise ValueError(f"not supported dataset name: {dataset_name}")
 
 def load_config(config_file_path):
-    with open(config_file_path, "r", encoding="utf-8") as path:
-        return json.load(path)
+    return default_store().load_config(config_file_path)
 
-def write_config(config, output_file_path):
-    with open(output_file_path, "w", encoding="utf-8") as path:
-        json.dump(config, path, indent=4, ensure_ascii=False)
+def write_config(updates, output_file_path, replace=False):
+    # 既定では、このスクリプトが設定したキーだけを既存の設定にマージする。
+    # 起動時に読んだ設定全体を渡すと、実行中に他のプロセスが更新したキー（ジョブ ID など）を古い値に戻してしまう
+    default_store().update_config(output_file_path, updates, replace=replace)
 
 
 def make_messages(system_message, prompt_template, en, jp):
@@ -107,80 +115,220 @@ class DataMaker:
         self.end_index = 0
         self.config = config
         self.parser = parser
-        self.embedder = LaBSEEmbedder()
+        self.embedder = LaBSEEmbedder(config.get("embedding_model", "sentence-transformers/LaBSE"))
         self.is_debug = is_debug
         self.similarity = config.get("similarity", 0.9)
         self.japanese_ratio = config.get("japanese_ratio", 0.6)
+        self.min_kana_ratio = config.get("min_kana_ratio")
+        self.max_latin_ratio = config.get("max_latin_ratio")
+        self.scan_batch_size = config.get("scan_batch_size", 256)
         self.processed_en = set()
+        self.metrics = Metrics()
+        self.progress = ProgressReporter(config.get("progress_interval", 5.0))
+        self.ledger = ScoreLedger(config.get("dataset", "")) if config.get("ledger") else None
+        # 言い換えの重複を避けるため、採用済み en の埋め込みから半径内の候補を除外する
+        self.diversity_radius = config.get("diversity_radius")
+        self.diversity_index = None
+        if self.diversity_radius is not None:
+            self.diversity_index = IVFIndex(
+                self.embedder.model.config.hidden_size,
+                max_list_size=config.get("diversity_list_size", 256),
+                nprobe=config.get("diversity_nprobe", 16),
+            )
 
     def log(self, message):
         if self.is_debug:
             pass
             # print(message)
     
-    def is_japanese(self, text):
-        # 日本語文字（ひらがな、カタカナ、漢字）をカウント
-        japanese_chars = re.findall(r'[ぁ-んァ-ン一-龥々]', text)
-        
-        # テキストの総文字数
-        total_chars = len(text)
-        
-        # 日本語文字の割合を計算
-        japanese_ratio = len(japanese_chars) / total_chars if total_chars > 0 else 0
-        
-        if self.is_debug and not(len(japanese_chars) > 0 and japanese_ratio >= self.japanese_ratio):
-            # self.log("len(japanese_chars) > 0", len(japanese_chars) > 0)
-            # self.log("japanese_ratio >= self.japanese_ratio", japanese_ratio >= self.japanese_ratio)
+    def get_japanese_ratio(self, text):
+        # 日本語文字（ひらがな、カタカナ、漢字）の割合を計算（日本語文字が無ければ 0）
+        return float(classify_scripts([text]).japanese_ratio()[0])
+
+    def script_filter(self, kana_ratio, latin_ratio):
+        # 文字種による追加フィルタ（かなを含まない中国語や英語混じりの訳文を除外する）
+        passed = np.ones(np.shape(kana_ratio), dtype=bool)
+        if self.min_kana_ratio is not None:
+            passed &= kana_ratio >= self.min_kana_ratio
+        if self.max_latin_ratio is not None:
+            passed &= latin_ratio <= self.max_latin_ratio
+        return passed
+
+    def iter_rows(self, start):
+        # scan_batch_size 行ずつ読み出し、文字種の判定はバッチでまとめて行う
+        parser = self.parser
+        data_length = parser.data_length()
+        for block_start in range(start, data_length, self.scan_batch_size):
+            block = range(block_start, min(block_start + self.scan_batch_size, data_length))
+            with self.metrics.timer("dataset_stage_seconds", stage="parse"):
+                rows = [parser.parse(i) for i in block]
+            with self.metrics.timer("dataset_stage_seconds", stage="is_japanese"):
+                stats = classify_scripts([jp for _, jp in rows])
+                ratios = zip(stats.japanese_ratio(), stats.kana_ratio(), stats.latin_ratio())
+            for i, (en, jp), (japanese_ratio, kana_ratio, latin_ratio) in zip(block, rows, ratios):
+                yield i, en, jp, float(japanese_ratio), float(kana_ratio), float(latin_ratio)
+
+    def is_japanese(self, text, japanese_ratio=None):
+        if japanese_ratio is None:
+            japanese_ratio = self.get_japanese_ratio(text)
+
+        if self.is_debug and not(japanese_ratio > 0 and japanese_ratio >= self.japanese_ratio):
             self.log(f"japanese wrong text: {text}")
 
         # 日本語文字が含まれていて、かつ{self.japanese_ratio}%以上であればTrueを返す
-        return len(japanese_chars) > 0 and japanese_ratio >= self.japanese_ratio
+        return japanese_ratio > 0 and japanese_ratio >= self.japanese_ratio
 
 
     def is_clean_data(self, en, jp) -> bool:
+        # 単発の判定なので台帳には記録しない
+        return self.score_data(None, en, jp, record=False)[0]
+
+    def score_data(
+        self, index, en, jp, japanese_ratio=None, kana_ratio=None, latin_ratio=None, record=True
+    ) -> Tuple[bool, float, np.ndarray]:
+        metrics = self.metrics
+        ledger = self.ledger if record else None
+        if japanese_ratio is None:
+            with metrics.timer("dataset_stage_seconds", stage="is_japanese"):
+                stats = classify_scripts([jp])
+                japanese_ratio = float(stats.japanese_ratio()[0])
+                kana_ratio = float(stats.kana_ratio()[0])
+                latin_ratio = float(stats.latin_ratio()[0])
+        script_passed = bool(self.script_filter(kana_ratio, latin_ratio))
         # check jp is japanese text
-        if not self.is_japanese(jp):
+        if ledger is None:
+            if not self.is_japanese(jp, japanese_ratio):
+                metrics.inc("dataset_rejected_total", reason="japanese")
+                return False, None, None
+            if not script_passed:
+                metrics.inc("dataset_rejected_total", reason="script")
+                return False, None, None
+        # ledger 用: 閾値を後から変えられるよう、日本語を含む行は全て類似度を計算して記録する
+        similarity = None
+        en_embedding = None
+        if japanese_ratio > 0:
+            # check embedding similarity
+            with metrics.timer("dataset_stage_seconds", stage="labse"):
+                en_embedding = self.embedder.get_embedding(en)
+                similarity = float(
+                    self.embedder.cosine_similarity(en_embedding, self.embedder.get_embedding(jp))
+                )
+            if self.is_debug:
+                self.log(f"similarity: {similarity}")
+        if ledger is not None:
+            ledger.append(index, similarity, japanese_ratio, kana_ratio, latin_ratio, en, jp)
+            if not self.is_japanese(jp, japanese_ratio):
+                metrics.inc("dataset_rejected_total", reason="japanese")
+                return False, similarity, en_embedding
+            if not script_passed:
+                metrics.inc("dataset_rejected_total", reason="script")
+                return False, similarity, en_embedding
+        if similarity < self.similarity:
+            metrics.inc("dataset_rejected_total", reason="similarity")
+            return False, similarity, en_embedding
+        return True, similarity, en_embedding
+
+    def is_redundant(self, en_embedding) -> bool:
+        if self.diversity_index is None:
             return False
-        # check embedding similarity
-        similarity = self.embedder.compare_texts(en, jp)
-        if self.is_debug:
-            self.log(f"similarity: {similarity}")
-        return similarity >= self.similarity
-
-    def create_dataset(self, config, output_file, start, limit):
-        parser = self.parser
+        return self.diversity_index.has_neighbor_within(en_embedding, self.diversity_radius)
+
+    def mark_accepted(self, en, en_embedding):
+        self.processed_en.add(en)  # 処理したenを追加
+        if self.diversity_index is not None:
+            self.diversity_index.add(en_embedding)
+
+    def is_duplicate(self, en, en_embedding) -> bool:
+        with self.metrics.timer("dataset_stage_seconds", stage="dedup"):
+            if en in self.processed_en:
+                self.log("duplicate en")
+                self.metrics.inc("dataset_rejected_total", reason="duplicate")
+                return True
+            if self.is_redundant(en_embedding):
+                self.log("near-duplicate en")
+                self.metrics.inc("dataset_rejected_total", reason="near_duplicate")
+                return True
+        return False
+
+    def write_example(self, f, example):
+        with self.metrics.timer("dataset_stage_seconds", stage="write"):
+            f.write(json.dumps(example, ensure_ascii=False) + "\n")
+
+    def progress_message(self, entries_processed, limit):
+        def message(elapsed):
+            scanned = self.metrics.counter("dataset_rows_scanned_total")
+            return (
+                f"Processing entry {entries_processed} of {limit} "
+                f"(scanned {scanned:.0f} rows, {scanned / max(elapsed, 1e-9):.1f} rows/s, "
+                f"{entries_processed / max(elapsed, 1e-9):.1f} accepted/s)"
+            )
+        return message
+
+    def create_dataset(self, config, output_file, start, limit, splits=None):
+        metrics = self.metrics
         with open(output_file, "w", encoding="utf-8") as f:
+            writer = TrainingExampleWriter(lambda example: self.write_example(f, example), config, splits)
             entries_processed = 0
-            for i in range(start, parser.data_length()):
+            for i, en, jp, japanese_ratio, kana_ratio, latin_ratio in self.iter_rows(start):
                 self.end_index = i
                 if entries_processed >= limit:
                     break
-                en, jp = parser.parse(i)
-                if not self.is_clean_data(en, jp):
+                metrics.inc("dataset_rows_scanned_total")
+                self.progress.maybe_report(self.progress_message(entries_processed, limit))
+                is_clean, similarity, en_embedding = self.score_data(
+                    i, en, jp, japanese_ratio, kana_ratio, latin_ratio
+                )
+                if not is_clean:
                     self.log("not clean data or duplicate en")
                     self.log(f"en: {en}")
                     self.log(f"jp: {jp}")
                     continue
-                if en in self.processed_en:
-                    self.log("duplicate en")
+                if self.is_duplicate(en, en_embedding):
+                    continue
+                example = make_messages(config["system"], config["user"], en, jp)
+                status = writer.add(i, en, jp, example, similarity)
+                if status == "full":
+                    metrics.inc("dataset_rejected_total", reason="budget")
+                    break
+                if status == "rejected":
+                    metrics.inc("dataset_rejected_total", reason="budget")
+                    continue
+                # 検証・評価用に振り分けた行も、言い換えが学習データに混ざらないよう採用済みにする。
+                # budget_strategy "similarity" では後でヒープから外れた行も採用済みのままなので、
+                # その重複や言い換えは除外される（refilter_dataset の台帳選択と同じ挙動）
+                self.mark_accepted(en, en_embedding)
+                if status == "held_out":
+                    metrics.inc("dataset_rows_held_out_total")
                     continue
-                print(f"Processing entry {entries_processed+1} of {limit}")
-                f.write(
-                    json.dumps(
-                        make_messages(config["system"], config["user"], en, jp),
-                        ensure_ascii=False,
-                    )
-                    + "\n"
-                )
-                self.processed_en.add(en)  # 処理したenを追加
                 entries_processed += 1
+                metrics.inc("dataset_rows_accepted_total")
+            entries_processed = writer.finish()
+        self.progress.maybe_report(self.progress_message(entries_processed, limit), force=True)
         print(
             f"File '{output_file}' has been created with {entries_processed} entries."
         )
+        return entries_processed
     
 
 
 
+def record_splits(config, config_file_path, splits):
+    """Record the validation and eval files written by `splits`. Returns the config keys pointing at them."""
+    print(f"Held out {splits.summary()}.")
+    updates = {}
+    if splits.splitter.validation_ratio:
+        updates["ft_validation_file"] = splits.validation_file
+        default_store().record_dataset(
+            splits.validation_file, config_file_path, config["dataset"], splits.counts["validation"]
+        )
+    if splits.splitter.eval_size:
+        updates["ft_eval_file"] = splits.eval_file
+        default_store().record_dataset(
+            splits.eval_file, config_file_path, config["dataset"], len(splits.reservoir.items)
+        )
+    return updates
+
+
 # def create_single_entry_files(config, en_file, jp_file, index):
 #     parser = get_parser(config["dataset"])
 #     en, jp = parser.parse(index)
@@ -200,8 +348,7 @@ def main():
     config_file = os.path.splitext(os.path.basename(config_file_path))[0]
     config = load_config(config_file_path)
 
-    config["ft_dataset_file_start_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    write_config(config, config_file_path)
+    write_config({"ft_dataset_file_start_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, config_file_path)
 
     # Create output directory
     output_dir = f"config/{config_file}"
@@ -213,11 +360,28 @@ def main():
     limit = config.get("limit", 100)
     parser = get_parser(config["dataset"])
     data_maker = DataMaker(config, parser, is_debug=True)
-    data_maker.create_dataset(config, main_output_file, start, limit)
-    config["ft_dataset_file"] = main_output_file
-    config["end_index"] = data_maker.end_index
-    config["ft_dataset_file_created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    write_config(config, config_file_path)
+    splitter = DatasetSplitter.from_config(config)
+    updates = {"ft_dataset_file": main_output_file}
+    if splitter is None:
+        rows = data_maker.create_dataset(config, main_output_file, start, limit)
+    else:
+        with SplitWriter(
+            splitter,
+            f"{output_dir}/{config_file}_validation_dataset.jsonl",
+            f"{output_dir}/{config_file}_eval_dataset.jsonl",
+        ) as splits:
+            rows = data_maker.create_dataset(config, main_output_file, start, limit, splits)
+        updates.update(record_splits(config, config_file_path, splits))
+    default_store().record_dataset(main_output_file, config_file_path, config["dataset"], rows)
+    data_maker.metrics.write(f"{output_dir}/{config_file}_metrics")
+    if data_maker.ledger is not None:
+        ledger_file = f"{output_dir}/{config_file}_ledger.npz"
+        data_maker.ledger.save(ledger_file)
+        updates["ft_ledger_file"] = ledger_file
+        print(f"Score ledger with {len(data_maker.ledger)} rows saved to {ledger_file}")
+    updates["end_index"] = data_maker.end_index
+    updates["ft_dataset_file_created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    write_config(updates, config_file_path)
     print(f"config saved to {config_file_path}")
     analyzer = DatasetAnalyzer(main_output_file)
     analyzer.run_analysis()
@@ -1,5 +1,14 @@
+import codecs
 import json
 import argparse
+import os
+from itertools import zip_longest
+import tiktoken
+
+SECTION_SEPARATOR = "################"
+ENCODINGS = ["utf-8", "shift_jis", "euc_jp", "iso2022_jp"]
+# en/ja の行数が違う場合に zip_longest が埋める値
+MISSING = object()
 
 
 def main(lines_per_dataset, output_file_name):
@@ -18,7 +27,7 @@ def main(lines_per_dataset, output_file_name):
     buffer = []
     with open(output_file, "w", encoding="utf-8") as jsonl_file:
         for index, (en, ja) in enumerate(zip(en_lines, ja_lines), start=1):
-            if "################" in en or "################" in ja:
+            if SECTION_SEPARATOR in en or SECTION_SEPARATOR in ja:
                 if buffer:
                     write_data(jsonl_file, buffer, inserted_count)
                     inserted_count += 1
@@ -37,6 +46,125 @@ def main(lines_per_dataset, output_file_name):
             write_data(jsonl_file, buffer, inserted_count)
 
 
+def main_packed(target_tokens, output_file_name, batch_size=1024):
+    en_file = "original/en.txt"
+    ja_file = "original/ja_utf8.txt"
+    output_file = f"{output_file_name}_{target_tokens}tok.jsonl"
+    # 各ファイルは一度だけ読む。行数の不一致は読み終わるまで分からないため、一時ファイルに書いてから置き換える
+    temp_file = output_file + ".tmp"
+    try:
+        inserted_count = pack_lines(en_file, ja_file, temp_file, target_tokens, batch_size)
+    except BaseException as e:
+        # デコードエラーや Ctrl-C でも一時ファイルを残さない
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        if isinstance(e, LineCountMismatch):
+            print("Error: Files have different number of lines.")
+            return
+        raise
+    os.replace(temp_file, output_file)
+    print(f"File '{output_file}' has been created with {inserted_count} entries.")
+
+
+class LineCountMismatch(Exception):
+    pass
+
+
+def iter_pairs(en_lines, ja_lines):
+    for en, ja in zip_longest(en_lines, ja_lines, fillvalue=MISSING):
+        if en is MISSING or ja is MISSING:
+            raise LineCountMismatch()
+        yield en, ja
+
+
+def pack_lines(en_file, ja_file, output_file, target_tokens, batch_size):
+    encoding = tiktoken.get_encoding("cl100k_base")
+    inserted_count = 0
+    buffer = []
+    buffer_tokens = 0
+    en_lines = iter_lines(en_file, detect_encoding(en_file))
+    ja_lines = iter_lines(ja_file, detect_encoding(ja_file))
+    with open(output_file, "w", encoding="utf-8") as jsonl_file:
+        for batch in iter_batches(enumerate(iter_pairs(en_lines, ja_lines), start=1), batch_size):
+            # バッチ内の en/ja をまとめてトークン化する（区切り行は None のまま）
+            rows = []
+            for index, (en, ja) in batch:
+                if SECTION_SEPARATOR in en or SECTION_SEPARATOR in ja:
+                    rows.append(None)
+                elif ja.strip() == "" or en.strip() == "":
+                    continue
+                else:
+                    rows.append((index, en.strip(), "".join(ja.strip().split())))
+            lines = [row for row in rows if row is not None]
+            token_lists = encoding.encode_ordinary_batch(
+                [row[1] for row in lines] + [row[2] for row in lines]
+            )
+            counts = iter(
+                len(en_tokens) + len(ja_tokens)
+                for en_tokens, ja_tokens in zip(token_lists[: len(lines)], token_lists[len(lines) :])
+            )
+
+            for row in rows:
+                if row is None:
+                    if buffer:
+                        write_data(jsonl_file, buffer, inserted_count)
+                        inserted_count += 1
+                        buffer = []
+                        buffer_tokens = 0
+                    continue
+                n_tokens = next(counts)
+                if buffer and buffer_tokens + n_tokens > target_tokens:
+                    write_data(jsonl_file, buffer, inserted_count)
+                    inserted_count += 1
+                    buffer = []
+                    buffer_tokens = 0
+                buffer.append(row)
+                buffer_tokens += n_tokens
+
+        # 残りのデータを処理
+        if buffer:
+            write_data(jsonl_file, buffer, inserted_count)
+            inserted_count += 1
+    return inserted_count
+
+
+def iter_batches(iterable, batch_size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def detect_encoding(filename, prefix_size=1024 * 1024):
+    # 先頭 prefix_size バイトだけでデコードできるエンコーディングを判定する（ファイル全体は読まない）
+    with open(filename, "rb") as file:
+        prefix = file.read(prefix_size)
+    for encoding in ENCODINGS:
+        try:
+            # final=False なので、末尾で途切れたマルチバイト文字はエラーにならない
+            codecs.getincrementaldecoder(encoding)().decode(prefix)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(
+        f"Unable to decode the file {filename} with any of the attempted encodings."
+    )
+
+
+def iter_lines(filename, encoding):
+    with open(filename, "r", encoding=encoding) as file:
+        try:
+            yield from file
+        except UnicodeDecodeError as e:
+            raise ValueError(
+                f"{filename} was detected as {encoding} from its beginning, but fails to decode later: {e}"
+            ) from e
+
+
 def write_data(jsonl_file, buffer, inserted_count):
     data = {
         "id": inserted_count + 1,
@@ -51,8 +179,7 @@ def write_data(jsonl_file, buffer, inserted_count):
 
 
 def read_file(filename):
-    encodings = ["utf-8", "shift_jis", "euc_jp", "iso2022_jp"]
-    for encoding in encodings:
+    for encoding in ENCODINGS:
         try:
             with open(filename, "r", encoding=encoding) as file:
                 return file.readlines()
@@ -65,12 +192,21 @@ def read_file(filename):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Create dataset resource")
-    parser.add_argument(
-        "--lines", type=int, required=True, help="Number of lines per dataset"
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "--lines", type=int, help="Number of lines per dataset"
+    )
+    group.add_argument(
+        "--tokens",
+        type=int,
+        help="Pack lines until the en+ja text reaches this many tokens (cl100k_base)",
     )
     parser.add_argument(
         "--output", type=str, required=True, help="Output file name without extension"
     )
     args = parser.parse_args()
 
-    main(args.lines, args.output)
+    if args.tokens:
+        main_packed(args.tokens, args.output)
+    else:
+        main(args.lines, args.output)
@@ -1,30 +1,22 @@
 import os
 from openai import OpenAI
 import numpy as np
+from src.lib.embed.retrieval import EmbeddingRetriever
 
 # OpenAI APIキーの設定
 # os.environ["OPENAI_API_KEY"] = "あなたのAPIキー"
 
 client = OpenAI()
 
-def get_embedding(text):
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-large"
-    )
-    return response.data[0].embedding
-
-def cosine_similarity(a, b):
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
 def find_most_similar(target, candidates):
-    target_embedding = get_embedding(target)
-    candidate_embeddings = [get_embedding(candidate) for candidate in candidates]
-    
-    similarities = [cosine_similarity(target_embedding, cand_emb) for cand_emb in candidate_embeddings]
-    
-    most_similar_index = np.argmax(similarities)
-    return most_similar_index, similarities[most_similar_index]
+    # 候補はまとめて 1 回のリクエストで埋め込み、行列積で類似度を求める
+    retriever = EmbeddingRetriever(client)
+    retriever.add(candidates)
+    indices, scores = retriever.search([target], k=len(candidates))
+    similarities = np.empty(len(candidates), dtype=np.float32)
+    similarities[indices[0]] = scores[0]
+    most_similar_index = int(indices[0, 0])
+    return most_similar_index, similarities
 
 # サンプルテキスト
 target = "東京は日本の首都で、世界有数の大都市です。"
@@ -37,7 +29,8 @@ candidates = [
 ]
 
 # 最も類似した候補を見つける
-most_similar_index, similarity = find_most_similar(target, candidates)
+most_similar_index, similarities = find_most_similar(target, candidates)
+similarity = similarities[most_similar_index]
 
 # 結果の表示
 print(f"ターゲット: {target}\n")
@@ -52,5 +45,4 @@ print(f"類似度: {similarity:.4f}")
 # すべての候補との類似度を表示
 print("\nすべての候補との類似度:")
 for i, candidate in enumerate(candidates):
-    _, sim = find_most_similar(target, [candidate])
-    print(f"候補 {i+1}: {sim:.4f}")
\ No newline at end of file
+    print(f"候補 {i+1}: {similarities[i]:.4f}")
\ No newline at end of file
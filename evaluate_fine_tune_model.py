@@ -1,6 +1,10 @@
-import sys
+import argparse
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import tiktoken
 from openai import OpenAI
+from src.lib.eval.chunking import chunk_text, join_chunks
 
 
 def load_config(config_file):
@@ -45,7 +49,60 @@ def print_completion(model_name, text):
     print("\n")
 
 
-def main(config_file, eval_type):
+def get_models(config, eval_type):
+    models = [config["base_model"]]
+    ft_model = config.get("ft_model")
+    if ft_model:
+        models.append(ft_model)
+    else:
+        print("ft_model is not set in the config file.")
+    for key in ("compare_model", "compare_model2"):
+        if config.get(key):
+            models.append(config[key])
+    if config.get("compare_model3") and eval_type != "a":
+        models.append(config["compare_model3"])
+    return models
+
+
+def translate_chunked(client, config, models, target_str, chunk_tokens, workers):
+    # 段落・文の境界でトークン数を制限したチャンクに分け、全モデル×全チャンクを並列に翻訳する
+    encoding = tiktoken.get_encoding("cl100k_base")
+    chunks = chunk_text(target_str, chunk_tokens, encoding)
+    print(f"Split into {len(chunks)} chunks of at most {chunk_tokens} tokens")
+
+    def translate(task):
+        model, chunk = task
+        messages = make_messages(config["system"], config["user"], chunk["text"])
+        return get_completion_text(get_completion(client, model, messages))
+
+    tasks = [(model, chunk) for model in models for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        texts = list(executor.map(translate, tasks))
+    results = {}
+    for i, model in enumerate(models):
+        model_texts = texts[i * len(chunks) : (i + 1) * len(chunks)]
+        results[model] = {"chunks": model_texts, "text": join_chunks(chunks, model_texts)}
+    return chunks, results
+
+
+def write_chunked_results(output_dir, eval_type, chunks, results):
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = f"{output_dir}/chunked_eval_{eval_type}.json"
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(
+            {"source_chunks": [chunk["text"] for chunk in chunks], "models": results},
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
+    for model, result in results.items():
+        model_file = f"{output_dir}/chunked_eval_{eval_type}_{model.replace(':', '_').replace('/', '_')}.txt"
+        with open(model_file, "w", encoding="utf-8") as f:
+            f.write(result["text"])
+    print(f"Chunked results written to {output_file}")
+
+
+def main(config_file, eval_type, chunk_tokens=None, workers=8):
     config = load_config(config_file)
 
     if eval_type == "a":
@@ -68,6 +125,17 @@ def main(config_file, eval_type):
 
     print_completion("original", target_str)
 
+    if chunk_tokens:
+        models = get_models(config, eval_type)
+        chunks, results = translate_chunked(
+            client, config, models, target_str, chunk_tokens, workers
+        )
+        for model, result in results.items():
+            print_completion(model + " case", result["text"])
+        write_chunked_results(f"config/{config_file}", eval_type, chunks, results)
+        print_reference(eval_type)
+        return
+
     base_completion = get_completion(client, config["base_model"], messages)
     print_completion(
         config["base_model"] + "case", get_completion_text(base_completion)
@@ -99,6 +167,10 @@ def main(config_file, eval_type):
             compare_model3 + " case", get_completion_text(compare_completion3)
         )
 
+    print_reference(eval_type)
+
+
+def print_reference(eval_type):
     if eval_type == "a":
         with open("evaluation_gpt4.txt", "r", encoding="utf-8") as f:
             print_completion("gpt4o case", f.read())
@@ -111,9 +183,20 @@ def main(config_file, eval_type):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python evaluate_fine_tune_model.py <config_file> <eval_type>")
-        print("eval_type should be 'a' or 'b'")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Compare the base model and the fine-tuned model outputs"
+    )
+    parser.add_argument("config_file", help="Name of the config file (without .json extension)")
+    parser.add_argument("eval_type", help="'a', 'b' or 'c'")
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=None,
+        help="Split the document into chunks of at most this many tokens and translate them in parallel",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=8, help="Concurrent requests in chunked mode"
+    )
+    args = parser.parse_args()
 
-    main(sys.argv[1], sys.argv[2])
+    main(args.config_file, args.eval_type, args.chunk_tokens, args.workers)
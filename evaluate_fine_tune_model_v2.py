@@ -1,3 +1,4 @@
+import os
 import sys
 import json
 from openai import OpenAI
@@ -5,6 +6,10 @@ from anthropic import Anthropic
 from typing import Dict, List, Union
 import numpy as np
 from datetime import datetime
+from src.lib.metrics import Metrics, ProgressReporter
+from src.lib.eval.latency import LatencyBenchmark
+from src.lib.eval.results_store import ResultsStore, pair_id
+from src.lib.eval.usage import UsageTracker
 
 EMBEDDING_MODEL = "text-embedding-3-large"
 
@@ -12,59 +17,169 @@ class Config:
     def __init__(self, config_file: str):
         with open(config_file, "r", encoding="utf-8") as f:
             self.data = json.load(f)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Config":
+        config = cls.__new__(cls)
+        config.data = dict(data)
+        return config
         
     def get(self, key: str, default=None):
         return self.data.get(key, default)
 
 class EvaluationRunner:
-    def __init__(self, config: Config):
+    def __init__(
+        self, config: Config, client: OpenAI = None, anthropic_client: Anthropic = None,
+        results_store: ResultsStore = None,
+    ):
         self.config = config
-        self.client = OpenAI()
-        self.anthropic_client = Anthropic()
+        self.client = client or OpenAI()
+        self.anthropic_client = anthropic_client or Anthropic()
+        self.metrics = Metrics()
+        self.progress = ProgressReporter(config.get("progress_interval", 5.0))
+        # true なら 1 回ごとの類似度も表示する
+        self.is_debug = config.get("debug", False)
+        self.completions = 0
+        self.usage = UsageTracker(config.get("prices"), config.get("budget_usd"), self.metrics)
+        self.estimate = {}
+        self.records = []
+        self.pair_ids = {}
+        # None なら config/ 以下の既定のストアに保存する（ベンチマークなどは一時ディレクトリのストアを渡す）
+        self.results_store = results_store
+
     def run(self):
         target_pairs = self.load_target_strings()
         models = self.get_models_to_evaluate()
         model_similarities = {model: {"scores":[], "avg":0, "data":[]} for model in models}
+        self.print_estimate(models, target_pairs)
         
-        for model in models:
-            for epoch in range(self.config.get("epoch", 1)):
-                for target_pair in target_pairs:
+        epochs = self.config.get("epoch", 1)
+        for model_number, model in enumerate(models, start=1):
+            for epoch in range(epochs):
+                for pair_number, target_pair in enumerate(target_pairs, start=1):
+                    if self.usage.exhausted:
+                        break
+                    self.progress.maybe_report(
+                        self.progress_message(model, model_number, len(models), epoch, epochs, pair_number, len(target_pairs))
+                    )
                     en_text = target_pair["en"]
                     ja_text = target_pair["ja"]
                     messages = self.make_messages(en_text, model)
-                    completion = get_completion(self.client, self.anthropic_client, model, messages)
+                    with self.metrics.timer("evaluation_completion_seconds", model=model):
+                        completion = get_completion(self.client, self.anthropic_client, model, messages)
+                    self.metrics.inc("evaluation_completions_total", model=model)
+                    self.completions += 1
+                    self.usage.record(model, "completion", completion)
                     try:
-                        similarity = self.evaluate(ja_text, get_completion_text(completion))
+                        similarity = self.evaluate(ja_text, get_completion_text(completion), model)
                     except Exception as e:
                         print(f"Error: {e}")
                         print(f"Model: {model}, reference: {ja_text}, Completion: {completion}")
+                        self.metrics.inc("evaluation_errors_total", model=model)
                         continue
                     model_similarities[model]["scores"].append(similarity)
+                    self.records.append((model, self.pair_id(en_text), epoch, float(similarity)))
                     model_similarities[model]["data"].append(get_completion_text(completion))
-                    print(f"Model: {model}, Embedding 類似度: {similarity:.4f}")
+                    if self.is_debug:
+                        print(f"Model: {model}, Embedding 類似度: {similarity:.4f}")
+        self.progress.maybe_report(
+            lambda elapsed: f"Evaluated {len(models)} models: {self.completions} completions "
+            f"({self.completions / max(elapsed, 1e-9):.1f} completions/s)",
+            force=True,
+        )
+        if self.usage.exhausted:
+            print(f"Budget of ${self.usage.budget:.4f} reached; stopped scheduling requests.")
 
         # Calculate average similarities and sort models
+        usage = self.usage.summary()
         for model, similarities in model_similarities.items():
-            avg_similarity = np.mean(similarities["scores"])
+            avg_similarity = np.mean(similarities["scores"]) if similarities["scores"] else 0.0
             model_similarities[model]["avg"] = avg_similarity
+            model_similarities[model]["usage"] = usage["models"].get(model)
         sorted_models = sorted(model_similarities.items(), key=lambda x: x[1]["avg"], reverse=True)
         
         # Print results
         for model, similarity_data in sorted_models:
-            print(f"{model}: {similarity_data['avg']:.4f}")
+            model_usage = similarity_data["usage"] or {}
+            print(
+                f"{model}: {similarity_data['avg']:.4f} "
+                f"(${model_usage.get('cost_usd', 0.0):.4f}, "
+                f"{model_usage.get('input_tokens', 0)} in / {model_usage.get('output_tokens', 0)} out tokens)"
+            )
+        print(f"Total cost: ${usage['total_cost_usd']:.4f}")
+
+        latency_config = self.config.get("latency_benchmark")
+        if latency_config and not self.usage.exhausted:
+            latency = self.run_latency_benchmark(models, target_pairs, latency_config)
+            for model, similarity_data in sorted_models:
+                similarity_data["latency"] = latency[model]
         
         # Write results to JSON file
         self.write_results_to_json(sorted_models)
 
-    def evaluate(self, reference: str, candidate: str) -> float:
-        similarity = self.cosine_similarity(self.get_embedding(reference), self.get_embedding(candidate))
-        return similarity
+    def run_latency_benchmark(self, models: List[str], target_pairs: List[Dict[str, str]], latency_config: Dict) -> Dict[str, Dict]:
+        n_requests = latency_config.get("requests", len(target_pairs))
+        benchmark = LatencyBenchmark(
+            self.client, self.anthropic_client, concurrency=latency_config.get("concurrency", 4)
+        )
+        return {
+            model: benchmark.run(
+                [model],
+                [
+                    self.make_messages(target_pairs[i % len(target_pairs)]["en"], model)
+                    for i in range(n_requests)
+                ],
+            )[model]
+            for model in models
+        }
+
+    def progress_message(self, model, model_number, n_models, epoch, epochs, pair_number, n_pairs):
+        def message(elapsed):
+            return (
+                f"Evaluating {model} (model {model_number}/{n_models}, epoch {epoch + 1}/{epochs}): "
+                f"pair {pair_number}/{n_pairs}, {self.completions} completions "
+                f"({self.completions / max(elapsed, 1e-9):.1f} completions/s)"
+            )
+        return message
 
-    def get_embedding(self, text):
-        response = self.client.embeddings.create(
-            input=text,
-            model=EMBEDDING_MODEL,
+    def pair_id(self, en_text: str) -> int:
+        if en_text not in self.pair_ids:
+            self.pair_ids[en_text] = pair_id(en_text)
+        return self.pair_ids[en_text]
+
+    def print_estimate(self, models: List[str], target_pairs: List[Dict[str, str]]):
+        estimate = self.usage.estimate(
+            models, target_pairs, self.config.get("epoch", 1), self.make_messages, EMBEDDING_MODEL
         )
+        if estimate is None:
+            # 見積もりは参考情報なので、トークナイザーを読み込めなくても評価は続ける
+            print("Warning: no tiktoken encoding is available (offline?); skipping the cost estimate.")
+            return
+        total = sum(model_estimate["cost_usd"] for model_estimate in estimate.values())
+        for model, model_estimate in estimate.items():
+            priced = "" if model_estimate["priced"] else " (no price configured)"
+            print(
+                f"Estimate {model}: {model_estimate['input_tokens']} in / "
+                f"{model_estimate['output_tokens']} out tokens, ${model_estimate['cost_usd']:.4f}{priced}"
+            )
+        budget = self.usage.budget
+        print(f"Estimated total: ${total:.4f}" + (f" (budget ${budget:.4f})" if budget is not None else ""))
+        if budget is not None and total > budget:
+            print("Warning: the estimate exceeds the budget; the run will stop when the budget is reached.")
+        self.estimate = estimate
+
+    def evaluate(self, reference: str, candidate: str, model: str = None) -> float:
+        similarity = self.cosine_similarity(self.get_embedding(reference, model), self.get_embedding(candidate, model))
+        return similarity
+
+    def get_embedding(self, text, model: str = None):
+        with self.metrics.timer("evaluation_embedding_seconds"):
+            response = self.client.embeddings.create(
+                input=text,
+                model=EMBEDDING_MODEL,
+            )
+        self.metrics.inc("evaluation_embeddings_total")
+        self.usage.record(model or EMBEDDING_MODEL, "embedding", response, priced_as=EMBEDDING_MODEL)
         return response.data[0].embedding
 
     def cosine_similarity(self, a, b):
@@ -97,6 +212,26 @@ class EvaluationRunner:
         with open(output_file, "w", encoding="utf-8") as f:
             json.dump(model_similarities, f, indent=2, ensure_ascii=False)
         print(f"Results written to {output_file}")
+        self.metrics.write(os.path.splitext(output_file)[0] + "_metrics")
+        usage_file = os.path.splitext(output_file)[0] + "_usage.json"
+        with open(usage_file, "w", encoding="utf-8") as f:
+            json.dump({"estimate": self.estimate, **self.usage.summary()}, f, indent=2, ensure_ascii=False)
+        print(f"Usage written to {usage_file}")
+        run = f"{current_time}_{os.path.splitext(os.path.basename(output_file))[0]}"
+        results_store = self.results_store or ResultsStore()
+        results_store.store.record_evaluation(
+            run,
+            self.config.get("dataset"),
+            {model: [float(score) for score in data["scores"]] for model, data in model_similarities},
+        )
+        results_path = results_store.save(
+            run,
+            self.config.get("dataset"),
+            output_file,
+            self.records,
+            {pair: en_text for en_text, pair in self.pair_ids.items()},
+        )
+        print(f"Per-pair scores of run {run} stored in {results_path}")
 
 def get_completion(client: OpenAI, anthropic_client: Anthropic, model: str, messages: List[Dict[str, str]]) -> dict:
     if model.startswith("claude"):
@@ -0,0 +1,68 @@
+import argparse
+import json
+
+from anthropic import Anthropic
+from openai import OpenAI
+
+from src.lib.eval.latency import LatencyBenchmark, merge_latency_into_results
+
+LEGACY_MODEL_KEYS = ("base_model", "ft_model", "compare_model", "compare_model2", "compare_model3")
+
+
+def load_config(config_file):
+    with open(config_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_models(config):
+    # evaluate_fine_tune_model_v2.py 形式の models、なければ evaluate_fine_tune_model.py 形式のキーを使う
+    if config.get("models"):
+        return config["models"]
+    return [config[key] for key in LEGACY_MODEL_KEYS if config.get(key)]
+
+
+def load_prompts(config, target_file=None):
+    if target_file:
+        with open(target_file, "r", encoding="utf-8") as f:
+            return [f.read()]
+    with open(config["dataset"], "r", encoding="utf-8") as f:
+        return [json.loads(line)["en"] for line in f if line.strip()]
+
+
+def make_messages(config, text):
+    return [
+        {"role": "system", "content": config["system"]},
+        {"role": "user", "content": config["user"].format(text=text)},
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure streaming latency of fine-tuned and base models"
+    )
+    parser.add_argument("config", help="Path to the config JSON file")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent requests per model")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per model")
+    parser.add_argument("--target", help="Text file to translate (default: en of the config dataset)")
+    parser.add_argument("--results", help="Evaluation results JSON to merge the latency figures into")
+    parser.add_argument("--output", help="Write the latency figures to this JSON file")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    prompts = load_prompts(config, args.target)
+    messages_list = [make_messages(config, prompts[i % len(prompts)]) for i in range(args.requests)]
+    benchmark = LatencyBenchmark(OpenAI(), Anthropic(), concurrency=args.concurrency)
+    latency = benchmark.run(get_models(config), messages_list)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(latency, f, indent=2, ensure_ascii=False)
+        print(f"Latency results written to {args.output}")
+    if args.results:
+        merge_latency_into_results(args.results, latency)
+    if not args.output and not args.results:
+        print(json.dumps(latency, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+
+from src.lib.store.experiments import STORE_PATH, ExperimentStore
+
+
+def print_table(rows, columns):
+    if not rows:
+        print("(none)")
+        return
+    widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+def list_configs(store, args):
+    filters = {
+        key: value
+        for key, value in (("dataset", args.dataset), ("base_model", args.base_model), ("ft_model", args.ft_model))
+        if value
+    }
+    rows = store.find_configs(**filters)
+    for row in rows:
+        data = row["data"]
+        row.update(
+            {
+                "dataset": data.get("dataset", ""),
+                "base_model": data.get("base_model", ""),
+                "ft_status": data.get("ft_status", ""),
+                "ft_model": data.get("ft_model", ""),
+            }
+        )
+    print_table(rows, ("path", "dataset", "base_model", "ft_status", "ft_model", "updated_at"))
+
+
+def list_jobs(store, args):
+    where, params = [], []
+    if args.status:
+        where.append("status = ?")
+        params.append(args.status)
+    if args.ft_model:
+        where.append("ft_model = ?")
+        params.append(args.ft_model)
+    rows = store.query(
+        "SELECT job_id, config_path, base_model, epochs, status, ft_model, trained_tokens, updated_at "
+        f"FROM jobs WHERE {' AND '.join(where) or '1'} ORDER BY updated_at",
+        tuple(params),
+    )
+    print_table(rows, ("job_id", "config_path", "base_model", "epochs", "status", "ft_model", "trained_tokens"))
+
+
+def list_evaluations(store, args):
+    where, params = [], []
+    if args.dataset:
+        where.append("dataset = ?")
+        params.append(args.dataset)
+    if args.ft_model:
+        where.append("model = ?")
+        params.append(args.ft_model)
+    rows = store.query(
+        "SELECT run, model, dataset, ROUND(avg_score, 4) AS avg_score, n_scores, created_at "
+        f"FROM evaluations WHERE {' AND '.join(where) or '1'} ORDER BY avg_score DESC",
+        tuple(params),
+    )
+    print_table(rows, ("model", "avg_score", "n_scores", "dataset", "run", "created_at"))
+
+
+def list_datasets(store, args):
+    where, params = ("source = ?", (args.dataset,)) if args.dataset else ("1", ())
+    rows = store.query(
+        f"SELECT path, config_path, source, rows, created_at FROM datasets WHERE {where} ORDER BY created_at",
+        params,
+    )
+    print_table(rows, ("path", "config_path", "source", "rows", "created_at"))
+
+
+COMMANDS = {
+    "configs": list_configs,
+    "jobs": list_jobs,
+    "evaluations": list_evaluations,
+    "datasets": list_datasets,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the experiment store")
+    parser.add_argument("table", choices=COMMANDS, nargs="?", default="configs")
+    parser.add_argument("--db", default=STORE_PATH, help="Path to the SQLite experiment store")
+    parser.add_argument("--dataset", help="Filter by source dataset (or evaluation dataset)")
+    parser.add_argument("--base-model", help="Filter configs by base model")
+    parser.add_argument("--ft-model", help="Filter by fine-tuned model")
+    parser.add_argument("--status", help="Filter jobs by status")
+    args = parser.parse_args()
+
+    COMMANDS[args.table](ExperimentStore(args.db), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,22 @@ import numpy as np
 from collections import defaultdict
 import sys
 
+MAX_TOKENS_PER_EXAMPLE = 16385
+TARGET_EPOCHS = 3
+
+
+def num_tokens_from_messages(encoding, messages, tokens_per_message=3, tokens_per_name=1):
+    num_tokens = 0
+    for message in messages:
+        num_tokens += tokens_per_message
+        for key, value in message.items():
+            num_tokens += len(encoding.encode(str(value)))
+            if key == "name":
+                num_tokens += tokens_per_name
+    num_tokens += 3
+    return num_tokens
+
+
 class DatasetAnalyzer:
     def __init__(self, data_path):
         self.data_path = data_path
@@ -57,15 +73,9 @@ class DatasetAnalyzer:
         return format_errors
 
     def num_tokens_from_messages(self, messages, tokens_per_message=3, tokens_per_name=1):
-        num_tokens = 0
-        for message in messages:
-            num_tokens += tokens_per_message
-            for key, value in message.items():
-                num_tokens += len(self.encoding.encode(str(value)))
-                if key == "name":
-                    num_tokens += tokens_per_name
-        num_tokens += 3
-        return num_tokens
+        return num_tokens_from_messages(
+            self.encoding, messages, tokens_per_message, tokens_per_name
+        )
 
     def num_assistant_tokens_from_messages(self, messages):
         num_tokens = 0
@@ -102,7 +112,7 @@ class DatasetAnalyzer:
         self.print_distribution(n_messages, "num_messages_per_example")
         self.print_distribution(convo_lens, "num_total_tokens_per_example")
         self.print_distribution(assistant_message_lens, "num_assistant_tokens_per_example")
-        n_too_long = sum(l > 16385 for l in convo_lens)
+        n_too_long = sum(l > MAX_TOKENS_PER_EXAMPLE for l in convo_lens)
         print(
             f"\n{n_too_long} examples may be over the 16,385 token limit, they will be truncated during fine-tuning"
         )
@@ -110,9 +120,6 @@ class DatasetAnalyzer:
         return convo_lens  # コスト見積もりのために会話の長さを返す
 
     def estimate_cost(self, convo_lens):
-        MAX_TOKENS_PER_EXAMPLE = 16385
-
-        TARGET_EPOCHS = 3
         MIN_TARGET_EXAMPLES = 100
         MAX_TARGET_EXAMPLES = 25000
         MIN_DEFAULT_EPOCHS = 1
@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+from create_dataset import get_parser, load_config, write_config, make_messages, record_splits
+from src.lib.dataset.budget import TrainingExampleWriter
+from src.lib.dataset.ledger import ScoreLedger, text_hash
+from src.lib.dataset.splits import DatasetSplitter, SplitWriter
+from src.lib.store.experiments import default_store
+from prep_and_analisys_dataset import DatasetAnalyzer
+
+
+def refilter_dataset(config, ledger, parser, output_file, splits=None):
+    start = config.get("start", 0)
+    limit = config.get("limit", 100)
+    if config.get("diversity_radius") is not None:
+        # 台帳には埋め込みを保存していないため、言い換えの重複除外は再現できない
+        print(
+            "Warning: diversity_radius is ignored by refilter_dataset.py because the ledger has no embeddings. "
+            "Re-run create_dataset.py to drop near-duplicate paraphrases."
+        )
+    # limit は学習データの件数。検証・評価に振り分けた行は数えないため、ここでは件数を絞らない
+    indices, en_hashes, _, similarities = ledger.select(
+        config.get("similarity", 0.9),
+        config.get("japanese_ratio", 0.6),
+        start=start,
+        min_kana_ratio=config.get("min_kana_ratio"),
+        max_latin_ratio=config.get("max_latin_ratio"),
+    )
+
+    n = 0
+    end_index = None
+    with open(output_file, "w", encoding="utf-8") as f:
+        writer = TrainingExampleWriter(
+            lambda example: f.write(json.dumps(example, ensure_ascii=False) + "\n"), config, splits
+        )
+        for index, en_hash, similarity in zip(indices, en_hashes, similarities):
+            index = int(index)
+            if n >= limit:
+                end_index = index
+                break
+            en, jp = parser.parse(index)
+            if text_hash(en) != int(en_hash):
+                raise ValueError(
+                    f"Source row {index} does not match the ledger. Was the dataset changed?"
+                )
+            example = make_messages(config["system"], config["user"], en, jp)
+            status = writer.add(index, en, jp, example, similarity)
+            if status == "full":
+                end_index = index
+                break
+            if status == "accepted":
+                n += 1
+        n = writer.finish()
+    print(f"File '{output_file}' has been created with {n} entries.")
+    if n < limit and ledger.end_index < parser.data_length() - 1:
+        print(
+            f"Warning: ledger only covers rows up to {ledger.end_index}, "
+            f"found {n} of {limit} entries. Re-run create_dataset.py to scan further."
+        )
+    # create_dataset と同じく、次の実行で start に指定できる未処理の先頭行を返す
+    if end_index is None:
+        end_index = max(ledger.end_index + 1, start)
+    return end_index, n
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python refilter_dataset.py <config_file>")
+        print("example: python refilter_dataset.py prompt_test4.json")
+        sys.exit(1)
+
+    config_file_path = sys.argv[1]
+    config_file = os.path.splitext(os.path.basename(config_file_path))[0]
+    config = load_config(config_file_path)
+
+    ledger_file = config.get("ft_ledger_file")
+    if not ledger_file or not os.path.exists(ledger_file):
+        raise FileNotFoundError(
+            "ft_ledger_file is not set or missing. Run create_dataset.py with \"ledger\": true first."
+        )
+    ledger = ScoreLedger.load(ledger_file)
+    if ledger.dataset != config["dataset"]:
+        raise ValueError(
+            f"Ledger was built from '{ledger.dataset}', but config dataset is '{config['dataset']}'."
+        )
+
+    output_dir = f"config/{config_file}"
+    os.makedirs(output_dir, exist_ok=True)
+    main_output_file = f"{output_dir}/{config_file}_dataset.jsonl"
+    parser = get_parser(config["dataset"])
+    splitter = DatasetSplitter.from_config(config)
+    updates = {"ft_dataset_file": main_output_file}
+    if splitter is None:
+        end_index, rows = refilter_dataset(config, ledger, parser, main_output_file)
+    else:
+        with SplitWriter(
+            splitter,
+            f"{output_dir}/{config_file}_validation_dataset.jsonl",
+            f"{output_dir}/{config_file}_eval_dataset.jsonl",
+        ) as splits:
+            end_index, rows = refilter_dataset(config, ledger, parser, main_output_file, splits)
+        updates.update(record_splits(config, config_file_path, splits))
+
+    default_store().record_dataset(main_output_file, config_file_path, config["dataset"], rows)
+    updates["end_index"] = end_index
+    updates["ft_dataset_file_created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    write_config(updates, config_file_path)
+    print(f"config saved to {config_file_path}")
+    analyzer = DatasetAnalyzer(main_output_file)
+    analyzer.run_analysis()
+
+
+if __name__ == "__main__":
+    main()
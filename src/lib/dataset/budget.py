@@ -0,0 +1,140 @@
+import heapq
+
+import tiktoken
+
+from prep_and_analisys_dataset import (
+    MAX_TOKENS_PER_EXAMPLE,
+    TARGET_EPOCHS,
+    num_tokens_from_messages,
+)
+
+
+def token_budget_from_config(config):
+    """Per-epoch dataset token budget from `token_budget` or `cost_budget`, or None if neither is set.
+
+    Both settings describe what is billed for training, i.e. dataset tokens x epochs.
+    """
+    n_epochs = config.get("epochs") or TARGET_EPOCHS
+    budgets = []
+    if config.get("token_budget"):
+        budgets.append(config["token_budget"])
+    if config.get("cost_budget"):
+        price = config.get("training_price_per_million")
+        if not price:
+            raise ValueError("training_price_per_million is required when cost_budget is set.")
+        budgets.append(config["cost_budget"] / price * 1_000_000)
+    if not budgets:
+        return None
+    return int(min(budgets) / n_epochs)
+
+
+class TokenBudgetSelector:
+    """Picks accepted candidates so that their billed tokens stay within `token_budget`.
+
+    strategy "order" keeps candidates in scan order and reports `full` as soon as the next
+    one does not fit. strategy "similarity" keeps a min-heap keyed on LaBSE similarity and
+    evicts the weakest examples whenever the budget is exceeded (greedy top-k knapsack).
+    """
+
+    def __init__(self, token_budget, strategy="order", encoding_name="cl100k_base"):
+        if strategy not in ("order", "similarity"):
+            raise ValueError(f"not supported budget strategy: {strategy}")
+        self.token_budget = token_budget
+        self.strategy = strategy
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.total_tokens = 0
+        self.full = False
+        self.n_too_long = 0
+        self.n_evicted = 0
+        self._selected = []
+        self._heap = []
+
+    def count_tokens(self, messages):
+        return num_tokens_from_messages(self.encoding, messages)
+
+    def offer(self, index, example, similarity=0.0):
+        """Offer an accepted example. Returns True if it is (currently) part of the selection."""
+        tokens = self.count_tokens(example["messages"])
+        if tokens > MAX_TOKENS_PER_EXAMPLE:
+            # 16,385 トークンを超える例は学習時に切り詰められるため採用しない
+            self.n_too_long += 1
+            return False
+
+        if self.strategy == "order":
+            if self.total_tokens + tokens > self.token_budget:
+                self.full = True
+                return False
+            self._selected.append((index, example))
+            self.total_tokens += tokens
+            return True
+
+        item = (float(similarity), -tokens, index, example)
+        heapq.heappush(self._heap, item)
+        self.total_tokens += tokens
+        kept = True
+        while self.total_tokens > self.token_budget:
+            evicted = heapq.heappop(self._heap)
+            self.total_tokens += evicted[1]
+            self.n_evicted += 1
+            if evicted is item:
+                kept = False
+        return kept
+
+    def selected(self):
+        """Selected examples in source order."""
+        if self.strategy == "order":
+            return list(self._selected)
+        return [(index, example) for _, _, index, example in sorted(self._heap, key=lambda x: x[2])]
+
+
+class TrainingExampleWriter:
+    """Route → budget → write step shared by DataMaker.create_dataset and refilter_dataset.
+
+    Each accepted example is first routed by `splits` (held-out pairs never reach the train
+    file), then offered to the token budget if one is configured, then passed to `write`.
+    With budget_strategy "similarity" the train examples are written by `finish()`, once the
+    best selection within the budget is known.
+    """
+
+    def __init__(self, write, config, splits=None):
+        self.write = write
+        self.splits = splits
+        self.token_budget = token_budget_from_config(config)
+        self.selector = None
+        if self.token_budget is not None:
+            self.selector = TokenBudgetSelector(self.token_budget, config.get("budget_strategy", "order"))
+        self.count = 0
+
+    def add(self, index, en, jp, example, similarity=0.0):
+        """Returns "held_out", "rejected" (over budget), "full" (stop scanning) or "accepted"."""
+        if self.splits is not None and self.splits.route(index, en, jp, example) != "train":
+            return "held_out"
+        if self.selector is not None:
+            if not self.selector.offer(index, example, float(similarity)):
+                if self.selector.full:
+                    print(f"Token budget of {self.token_budget:,} tokens reached.")
+                    return "full"
+                return "rejected"
+            self.count += 1
+            if self.selector.strategy == "similarity":
+                # 予算内の最良の組み合わせは finish() で書き出す
+                return "accepted"
+        else:
+            self.count += 1
+        self.write(example)
+        return "accepted"
+
+    def finish(self):
+        """Write the deferred selection, if any. Returns the number of train examples written."""
+        if self.selector is None:
+            return self.count
+        if self.selector.strategy == "similarity":
+            selected = self.selector.selected()
+            for _, example in selected:
+                self.write(example)
+            self.count = len(selected)
+        print(
+            f"Selected {self.count} entries with {self.selector.total_tokens:,} tokens "
+            f"(budget {self.token_budget:,}, {self.selector.n_too_long} too long, {self.selector.n_evicted} evicted)."
+        )
+        return self.count
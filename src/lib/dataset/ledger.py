@@ -0,0 +1,118 @@
+import hashlib
+from array import array
+
+import numpy as np
+
+
+def text_hash(text):
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little"
+    )
+
+
+class ScoreLedger:
+    """Columnar record of every scanned row, so thresholds can be re-applied without LaBSE."""
+
+    def __init__(self, dataset=""):
+        self.dataset = dataset
+        self.index = array("q")
+        self.similarity = array("f")
+        self.japanese_ratio = array("f")
+        self.kana_ratio = array("f")
+        self.latin_ratio = array("f")
+        self.en_hash = array("Q")
+        self.ja_hash = array("Q")
+        self.end_index = -1
+
+    def append(self, index, similarity, japanese_ratio, kana_ratio, latin_ratio, en, ja):
+        self.index.append(index)
+        # 類似度を計算していない行は NaN（どの閾値でも不採用になる）
+        self.similarity.append(np.nan if similarity is None else similarity)
+        self.japanese_ratio.append(japanese_ratio)
+        self.kana_ratio.append(kana_ratio)
+        self.latin_ratio.append(latin_ratio)
+        self.en_hash.append(text_hash(en))
+        self.ja_hash.append(text_hash(ja))
+        self.end_index = max(self.end_index, index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            dataset=np.array(self.dataset),
+            end_index=np.array(self.end_index, dtype=np.int64),
+            index=np.frombuffer(self.index, dtype=np.int64),
+            similarity=np.frombuffer(self.similarity, dtype=np.float32),
+            japanese_ratio=np.frombuffer(self.japanese_ratio, dtype=np.float32),
+            kana_ratio=np.frombuffer(self.kana_ratio, dtype=np.float32),
+            latin_ratio=np.frombuffer(self.latin_ratio, dtype=np.float32),
+            en_hash=np.frombuffer(self.en_hash, dtype=np.uint64),
+            ja_hash=np.frombuffer(self.ja_hash, dtype=np.uint64),
+        )
+
+    @classmethod
+    def load(cls, path):
+        ledger = cls()
+        with np.load(path) as data:
+            ledger.dataset = str(data["dataset"])
+            ledger.end_index = int(data["end_index"])
+            ledger.index = array("q", data["index"].tobytes())
+            ledger.similarity = array("f", data["similarity"].tobytes())
+            ledger.japanese_ratio = array("f", data["japanese_ratio"].tobytes())
+            # かな・ラテン文字の割合を持たない古い台帳では NaN（min_kana_ratio などは適用できない）
+            for name in ("kana_ratio", "latin_ratio"):
+                column = data[name] if name in data.files else np.full(len(ledger.index), np.nan, dtype=np.float32)
+                setattr(ledger, name, array("f", column.tobytes()))
+            ledger.en_hash = array("Q", data["en_hash"].tobytes())
+            ledger.ja_hash = array("Q", data["ja_hash"].tobytes())
+        return ledger
+
+    def columns(self):
+        return {
+            "index": np.frombuffer(self.index, dtype=np.int64),
+            "similarity": np.frombuffer(self.similarity, dtype=np.float32),
+            "japanese_ratio": np.frombuffer(self.japanese_ratio, dtype=np.float32),
+            "kana_ratio": np.frombuffer(self.kana_ratio, dtype=np.float32),
+            "latin_ratio": np.frombuffer(self.latin_ratio, dtype=np.float32),
+            "en_hash": np.frombuffer(self.en_hash, dtype=np.uint64),
+            "ja_hash": np.frombuffer(self.ja_hash, dtype=np.uint64),
+        }
+
+    def select(self, similarity, japanese_ratio, start=0, limit=None, min_kana_ratio=None, max_latin_ratio=None):
+        """Source indices DataMaker would accept for these settings, in scan order.
+
+        Returns (index, en_hash, ja_hash, similarity) arrays.
+        """
+        cols = self.columns()
+        order = np.argsort(cols["index"], kind="stable")
+        index = cols["index"][order]
+        mask = (
+            (index >= start)
+            & (cols["japanese_ratio"][order] > 0)
+            & (cols["japanese_ratio"][order] >= japanese_ratio)
+            & (cols["similarity"][order] >= similarity)
+        )
+        for name, bound, keep in (
+            ("kana_ratio", min_kana_ratio, np.greater_equal),
+            ("latin_ratio", max_latin_ratio, np.less_equal),
+        ):
+            if bound is None:
+                continue
+            column = cols[name][order]
+            if np.isnan(column).any():
+                raise ValueError(f"Ledger has no {name} column. Re-run create_dataset.py to apply this filter.")
+            mask &= keep(column, bound)
+        candidates = np.flatnonzero(mask)
+        # 重複した en は最初に採用された行だけ残す
+        _, first = np.unique(cols["en_hash"][order][candidates], return_index=True)
+        candidates = np.sort(candidates[first])
+        if limit is not None:
+            candidates = candidates[:limit]
+        return (
+            index[candidates],
+            cols["en_hash"][order][candidates],
+            cols["ja_hash"][order][candidates],
+            cols["similarity"][order][candidates],
+        )
@@ -0,0 +1,112 @@
+import json
+import random
+
+from src.lib.dataset.ledger import text_hash
+
+HASH_RANGE = float(2 ** 64)
+
+
+def split_fraction(text, salt=""):
+    """Stable position of `text` in [0, 1), independent of row order and of `start`/`limit`."""
+    return text_hash(salt + text) / HASH_RANGE
+
+
+class ReservoirSample:
+    """Uniform sample of at most `size` items from a stream of unknown length (Algorithm R)."""
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.rng = random.Random(seed)
+        self.items = []
+        self.seen = 0
+
+    def offer(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        j = self.rng.randrange(self.seen)
+        if j < self.size:
+            self.items[j] = item
+
+
+class DatasetSplitter:
+    """Assigns each accepted pair to "train", "validation" or "eval" by hashing its English text.
+
+    The same sentence always lands in the same split, so re-running with another `limit`
+    or `start` never moves a held-out pair into training.
+    """
+
+    def __init__(self, validation_ratio=0.0, eval_ratio=0.0, eval_size=0, seed=0):
+        if validation_ratio < 0 or eval_ratio < 0 or validation_ratio + eval_ratio >= 1:
+            raise ValueError("validation_ratio and eval_ratio must be >= 0 and sum to less than 1.")
+        self.validation_ratio = validation_ratio
+        self.eval_ratio = eval_ratio
+        self.eval_size = eval_size
+        self.seed = seed
+        self.salt = f"{seed}:"
+
+    @classmethod
+    def from_config(cls, config):
+        """Splitter for `validation_ratio`, `eval_size` and `eval_ratio`, or None if none are set."""
+        validation_ratio = config.get("validation_ratio", 0.0)
+        eval_size = config.get("eval_size", 0)
+        if not validation_ratio and not eval_size:
+            return None
+        # eval_size だけ指定された場合は 5% をホールドアウトの候補にする
+        eval_ratio = config.get("eval_ratio", 0.05) if eval_size else 0.0
+        return cls(validation_ratio, eval_ratio, eval_size, config.get("split_seed", 0))
+
+    def split(self, en):
+        fraction = split_fraction(en, self.salt)
+        if fraction < self.eval_ratio:
+            return "eval"
+        if fraction < self.eval_ratio + self.validation_ratio:
+            return "validation"
+        return "train"
+
+
+class SplitWriter:
+    """Writes validation examples as they arrive and the eval reservoir on close.
+
+    Pairs in the eval bucket are never written to train or validation; `eval_size` of them
+    are kept by reservoir sampling and written as {"en", "ja"} lines in source order.
+    """
+
+    def __init__(self, splitter, validation_file=None, eval_file=None):
+        self.splitter = splitter
+        self.validation_file = validation_file
+        self.eval_file = eval_file
+        self.reservoir = ReservoirSample(splitter.eval_size, splitter.seed)
+        self.counts = {"train": 0, "validation": 0, "eval": 0}
+        self._validation = None
+
+    def __enter__(self):
+        if self.validation_file and self.splitter.validation_ratio:
+            self._validation = open(self.validation_file, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc):
+        if self._validation is not None:
+            self._validation.close()
+        if exc[0] is None and self.eval_file and self.splitter.eval_size:
+            with open(self.eval_file, "w", encoding="utf-8") as f:
+                for _, pair in sorted(self.reservoir.items, key=lambda x: x[0]):
+                    f.write(json.dumps(pair, ensure_ascii=False) + "\n")
+        return False
+
+    def route(self, index, en, jp, example):
+        """Write `example` to its split unless it belongs to train. Returns the split name."""
+        split = self.splitter.split(en)
+        self.counts[split] += 1
+        if split == "validation" and self._validation is not None:
+            self._validation.write(json.dumps(example, ensure_ascii=False) + "\n")
+        elif split == "eval":
+            self.reservoir.offer((index, {"en": en, "ja": jp}))
+        return split
+
+    def summary(self):
+        return (
+            f"{self.counts['validation']} validation entries, "
+            f"{len(self.reservoir.items)} eval pairs (of {self.counts['eval']} held out)"
+        )
@@ -0,0 +1,220 @@
+from array import array
+
+import numpy as np
+
+
+class GrowableMatrix:
+    """Row-appendable matrix with amortised O(1) appends."""
+
+    def __init__(self, dim, capacity=64, growth=2.0, dtype=np.float32):
+        self.data = np.empty((capacity, dim), dtype=dtype)
+        self.size = 0
+        self.growth = growth
+
+    @classmethod
+    def from_rows(cls, rows, headroom=1.25, growth=2.0):
+        matrix = cls(rows.shape[1], max(int(len(rows) * headroom), len(rows) + 1), growth)
+        matrix.data[: len(rows)] = rows
+        matrix.size = len(rows)
+        return matrix
+
+    def append(self, row):
+        if self.size == len(self.data):
+            grown = np.empty(
+                (max(int(len(self.data) * self.growth), len(self.data) + 1), self.data.shape[1]),
+                dtype=self.data.dtype,
+            )
+            grown[: self.size] = self.data[: self.size]
+            self.data = grown
+        self.data[self.size] = row
+        self.size += 1
+
+    def view(self):
+        return self.data[: self.size]
+
+
+def top_k(scores, k):
+    if k >= len(scores):
+        return np.arange(len(scores))
+    return np.argpartition(-scores, k)[:k]
+
+
+def normalize_rows(rows):
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows / np.where(norms > 0, norms, 1.0)
+
+
+class IVFIndex:
+    """Two-level inverted-file cosine index that grows by splitting, with exact re-ranking.
+
+    Vectors are L2-normalised and searched through a `sketch_dim`-dimensional random
+    orthonormal projection (a Johnson-Lindenstrauss sketch), which cuts the memory read
+    per scanned row by dim / sketch_dim. Sketches live in lists of at most `max_list_size`
+    rows, each with a centroid, and the list centroids are grouped under group centroids
+    of at most `max_group_size` members. When a list (or group) overflows it is split in
+    two by a local 2-means, so the index is never retrained globally and list and group
+    sizes stay bounded as it grows.
+
+    A query scans all group centroids, the member centroids of the `ngroups` closest
+    groups and the sketches of the `nprobe` closest lists, then re-scores the `rerank`
+    best candidates exactly against the full vectors (kept as float16). Only the group
+    scan grows with N, by about one row per `max_list_size * max_group_size / 2` vectors,
+    so a query costs about the same at 10^4 and 10^6 entries. Recall is approximate: a
+    near duplicate is missed when its list is not among those probed, which happens more
+    often as the number of lists grows (raise `ngroups` / `nprobe` to trade speed for it).
+    `python -m benchmarks.run_benchmarks --ann-size 1000000` measures it at scale.
+    """
+
+    def __init__(self, dim, max_list_size=256, nprobe=16, max_group_size=128, ngroups=16,
+                 sketch_dim=128, rerank=8, kmeans_iters=5, block_rows=65536, seed=0):
+        self.dim = dim
+        self.max_list_size = max_list_size
+        self.nprobe = nprobe
+        self.max_group_size = max_group_size
+        self.ngroups = ngroups
+        self.rerank = rerank
+        self.kmeans_iters = kmeans_iters
+        self.rng = np.random.default_rng(seed)
+        if sketch_dim < dim:
+            q, _ = np.linalg.qr(self.rng.standard_normal((dim, sketch_dim)))
+            self.projection = q.astype(np.float32)
+        else:
+            self.projection = None
+        self.sketch_dim = min(sketch_dim, dim)
+        # 全次元のベクトルは固定サイズのブロックに追記し、拡張時のコピーを避ける
+        self.block_rows = block_rows
+        self.blocks = []
+        self.lists = []
+        self.list_ids = []
+        self.centroids = []
+        self.group_of = []
+        self.groups = []
+        self.group_matrices = []
+        self.group_centroids = GrowableMatrix(self.sketch_dim)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nlist(self):
+        return len(self.lists)
+
+    @staticmethod
+    def normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def sketch(self, vector):
+        if self.projection is None:
+            return vector
+        return self.normalize(vector @ self.projection)
+
+    def add(self, vector):
+        vector = self.normalize(vector)
+        sketch = self.sketch(vector)
+        row_id = self.count
+        if row_id % self.block_rows == 0:
+            self.blocks.append(np.empty((self.block_rows, self.dim), dtype=np.float16))
+        self.blocks[-1][row_id % self.block_rows] = vector
+        self.count += 1
+        if not self.lists:
+            self.lists.append(GrowableMatrix(self.sketch_dim, growth=1.5))
+            self.list_ids.append(array("q"))
+            self.centroids.append(sketch)
+            self.group_of.append(0)
+            self.groups.append(np.array([0]))
+            self.group_matrices.append(sketch[None, :].copy())
+            self.group_centroids.append(sketch)
+            list_id = 0
+        else:
+            list_id = int(self.probe(sketch, 1)[0])
+        self.lists[list_id].append(sketch)
+        self.list_ids[list_id].append(row_id)
+        if self.lists[list_id].size > self.max_list_size:
+            self._split_list(list_id)
+
+    def probe(self, sketch, nprobe):
+        """Ids of the `nprobe` lists whose centroids are closest to `sketch`."""
+        group_sims = self.group_centroids.view() @ sketch
+        ids = []
+        sims = []
+        for group in top_k(group_sims, self.ngroups):
+            ids.append(self.groups[group])
+            sims.append(self.group_matrices[group] @ sketch)
+        ids = np.concatenate(ids)
+        return ids[top_k(np.concatenate(sims), nprobe)]
+
+    def max_similarity(self, vector):
+        """Highest cosine similarity to any indexed vector (-1.0 when empty)."""
+        if self.count == 0:
+            return -1.0
+        vector = self.normalize(vector)
+        sketch = self.sketch(vector)
+        ids = []
+        sims = []
+        for list_id in self.probe(sketch, self.nprobe):
+            ids.append(np.frombuffer(self.list_ids[list_id], dtype=np.int64))
+            sims.append(self.lists[list_id].view() @ sketch)
+        ids = np.concatenate(ids)
+        candidates = ids[top_k(np.concatenate(sims), self.rerank)]
+        # スケッチ上の上位候補だけを元のベクトルで正確に比較する
+        full = np.stack([self.blocks[i // self.block_rows][i % self.block_rows] for i in candidates])
+        return float(np.max(full.astype(np.float32) @ vector))
+
+    def has_neighbor_within(self, vector, radius):
+        """True if some indexed vector lies within cosine distance `radius`."""
+        return self.max_similarity(vector) >= 1.0 - radius
+
+    def _two_means(self, rows):
+        """Boolean mask of the rows assigned to the second of two spherical k-means clusters."""
+        first = rows[self.rng.integers(len(rows))]
+        # 2 つ目の初期値は 1 つ目から最も遠い行
+        centroids = np.stack([first, rows[np.argmin(rows @ first)]])
+        mask = np.zeros(len(rows), dtype=bool)
+        for _ in range(self.kmeans_iters):
+            sims = rows @ centroids.T
+            mask = sims[:, 1] > sims[:, 0]
+            if mask.all() or not mask.any():
+                break
+            centroids = normalize_rows(np.stack([rows[~mask].sum(axis=0), rows[mask].sum(axis=0)]))
+        if mask.all() or not mask.any():
+            # 同一ベクトルばかりで分けられない場合は半分ずつにする
+            mask = np.arange(len(rows)) >= len(rows) // 2
+        return mask
+
+    def _split_list(self, list_id):
+        rows = self.lists[list_id].view()
+        row_ids = np.frombuffer(self.list_ids[list_id], dtype=np.int64)
+        mask = self._two_means(rows)
+        new_id = len(self.lists)
+        self.lists.append(GrowableMatrix.from_rows(rows[mask], growth=1.5))
+        self.list_ids.append(array("q", row_ids[mask].tobytes()))
+        self.centroids.append(self.normalize(rows[mask].sum(axis=0)))
+        self.centroids[list_id] = self.normalize(rows[~mask].sum(axis=0))
+        self.list_ids[list_id] = array("q", row_ids[~mask].tobytes())
+        self.lists[list_id] = GrowableMatrix.from_rows(rows[~mask], growth=1.5)
+        group = self.group_of[list_id]
+        self.group_of.append(group)
+        self._set_group(group, np.append(self.groups[group], new_id))
+        if len(self.groups[group]) > self.max_group_size:
+            self._split_group(group)
+
+    def _set_group(self, group, members):
+        self.groups[group] = members
+        matrix = np.stack([self.centroids[i] for i in members])
+        self.group_matrices[group] = matrix
+        self.group_centroids.view()[group] = self.normalize(matrix.sum(axis=0))
+
+    def _split_group(self, group):
+        members = self.groups[group]
+        mask = self._two_means(self.group_matrices[group])
+        new_group = len(self.groups)
+        self.groups.append(None)
+        self.group_matrices.append(None)
+        self.group_centroids.append(np.zeros(self.sketch_dim, dtype=np.float32))
+        for list_id in members[mask]:
+            self.group_of[list_id] = new_group
+        self._set_group(group, members[~mask])
+        self._set_group(new_group, members[mask])
@@ -15,6 +15,16 @@ class LaBSEEmbedder:
             outputs = self.model(**inputs)
         return outputs.last_hidden_state.mean(dim=1).squeeze().cpu().numpy()
 
+    def get_embeddings(self, texts):
+        # バッチでまとめて推論する。パディングは attention_mask で平均から除外する
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=512)
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+        mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+        summed = (outputs.last_hidden_state * mask).sum(dim=1)
+        return (summed / mask.sum(dim=1).clamp(min=1)).cpu().numpy()
+
     @staticmethod
     def cosine_similarity(a, b):
         return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
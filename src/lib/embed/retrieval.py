@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+
+def embed_texts(client, texts, model=EMBEDDING_MODEL, batch_size=256):
+    """Embed `texts` with one API request per batch and return an L2-normalised float32 matrix."""
+    rows = []
+    for start in range(0, len(texts), batch_size):
+        # 空文字列は API でエラーになるため空白に置き換える
+        batch = [text if text else " " for text in texts[start : start + batch_size]]
+        response = client.embeddings.create(input=batch, model=model)
+        data = sorted(response.data, key=lambda item: item.index)
+        rows.extend(item.embedding for item in data)
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32)
+    return normalize_rows(np.asarray(rows, dtype=np.float32))
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def load_dataset_texts(data_path, role="user"):
+    """Message contents for `role` from a fine-tuning JSONL file, one per example."""
+    texts = []
+    with open(data_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            messages = json.loads(line)["messages"]
+            texts.append(next((m["content"] for m in messages if m["role"] == role), ""))
+    return texts
+
+
+class EmbeddingRetriever:
+    def __init__(self, client, model=EMBEDDING_MODEL, batch_size=256):
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+        self.texts = []
+        self.matrix = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def embed(self, texts):
+        return embed_texts(self.client, texts, self.model, self.batch_size)
+
+    def add(self, texts):
+        texts = list(texts)
+        embeddings = self.embed(texts)
+        self.matrix = embeddings if self.matrix is None else np.vstack([self.matrix, embeddings])
+        self.texts.extend(texts)
+
+    def save(self, path):
+        np.savez(
+            path,
+            model=np.array(self.model),
+            matrix=self.matrix,
+            texts=np.frombuffer(json.dumps(self.texts, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+        )
+
+    @classmethod
+    def load(cls, path, client, batch_size=256):
+        with np.load(path) as data:
+            retriever = cls(client, model=str(data["model"]), batch_size=batch_size)
+            retriever.matrix = data["matrix"]
+            retriever.texts = json.loads(data["texts"].tobytes().decode("utf-8"))
+        return retriever
+
+    def search(self, queries, k=5):
+        """Top-k corpus rows for each query text, as (indices, scores) arrays of shape (n_queries, k)."""
+        return self.search_embeddings(self.embed(list(queries)), k)
+
+    def search_embeddings(self, query_embeddings, k=5, chunk_size=1024):
+        k = min(k, len(self.texts))
+        indices = np.empty((len(query_embeddings), k), dtype=np.int64)
+        scores = np.empty((len(query_embeddings), k), dtype=np.float32)
+        for start in range(0, len(query_embeddings), chunk_size):
+            sims = query_embeddings[start : start + chunk_size] @ self.matrix.T
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            indices[start : start + chunk_size] = np.take_along_axis(top, order, axis=1)
+            scores[start : start + chunk_size] = np.take_along_axis(top_scores, order, axis=1)
+        return indices, scores
+
+    def find_contamination(self, queries, threshold=0.95):
+        """(query index, corpus index, score) for every query whose nearest corpus row reaches `threshold`."""
+        indices, scores = self.search(queries, k=1)
+        hits = np.flatnonzero(scores[:, 0] >= threshold)
+        return [(int(i), int(indices[i, 0]), float(scores[i, 0])) for i in hits]
@@ -0,0 +1,84 @@
+import re
+
+PARAGRAPH_BREAK = re.compile(r"(\n\s*\n)")
+# 文末記号（英語は後続の空白まで、日本語は閉じ括弧まで）で区切る。区切り文字は前の文に残す
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|(?<=[。！？])[」』）]*")
+
+
+def split_sentences(paragraph):
+    pieces = []
+    last = 0
+    for match in SENTENCE_END.finditer(paragraph):
+        end = match.end()
+        if end > last:
+            pieces.append(paragraph[last:end])
+            last = end
+    if last < len(paragraph):
+        pieces.append(paragraph[last:])
+    return pieces
+
+
+def split_by_tokens(text, max_tokens, encoding):
+    tokens = encoding.encode(text)
+    return [encoding.decode(tokens[i : i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def chunk_text(text, max_tokens, encoding):
+    """Split `text` into chunks of at most `max_tokens` tokens on paragraph, then sentence boundaries.
+
+    Returns a list of {"text", "separator"} where `separator` is the source text that stood
+    between the previous chunk and this one, so that `join_chunks` restores the layout.
+    """
+    parts = PARAGRAPH_BREAK.split(text)
+    paragraphs = parts[0::2]
+    breaks = [""] + parts[1::2]
+    counts = [len(tokens) for tokens in encoding.encode_ordinary_batch(paragraphs)]
+
+    chunks = []
+    current = None
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current is not None and current["text"]:
+            chunks.append(current)
+        current = None
+        current_tokens = 0
+
+    for paragraph, separator, n_tokens in zip(paragraphs, breaks, counts):
+        if current is not None and current_tokens + n_tokens <= max_tokens:
+            current["text"] += separator + paragraph
+            current_tokens += n_tokens
+            continue
+        flush()
+        if n_tokens <= max_tokens:
+            current = {"text": paragraph, "separator": separator}
+            current_tokens = n_tokens
+            continue
+        # 長すぎる段落は文単位で詰め直す。1 文でも超える場合はトークンで機械的に分割する
+        pieces = []
+        for sentence in split_sentences(paragraph):
+            if len(encoding.encode(sentence)) > max_tokens:
+                pieces.extend(split_by_tokens(sentence, max_tokens, encoding))
+            else:
+                pieces.append(sentence)
+        piece_separator = separator
+        for piece in pieces:
+            n_piece = len(encoding.encode(piece))
+            if current is not None and current_tokens + n_piece <= max_tokens:
+                current["text"] += piece
+                current_tokens += n_piece
+                continue
+            flush()
+            current = {"text": piece, "separator": piece_separator}
+            current_tokens = n_piece
+            piece_separator = ""
+    flush()
+    return chunks
+
+
+def join_chunks(chunks, texts):
+    """Reassemble per-chunk `texts` (e.g. translations) using the separators of `chunks`."""
+    return "".join(
+        (chunk["separator"] if i else "") + text for i, (chunk, text) in enumerate(zip(chunks, texts))
+    )
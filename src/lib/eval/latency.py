@@ -0,0 +1,143 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def stream_openai(client, model, messages, clock=time.perf_counter):
+    start = clock()
+    first_token_at = None
+    n_chunks = 0
+    usage = None
+    stream = client.chat.completions.create(
+        model=model, messages=messages, stream=True, stream_options={"include_usage": True}
+    )
+    for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            if first_token_at is None:
+                first_token_at = clock()
+            n_chunks += 1
+    end = clock()
+    return {
+        "start": start,
+        "first_token_at": first_token_at,
+        "end": end,
+        "prompt_tokens": usage.prompt_tokens if usage else None,
+        # usage が返らない場合はチャンク数で近似する
+        "completion_tokens": usage.completion_tokens if usage else n_chunks,
+    }
+
+
+def stream_anthropic(anthropic_client, model, messages, clock=time.perf_counter):
+    system_message = next((msg["content"] for msg in messages if msg["role"] == "system"), None)
+    messages = [msg for msg in messages if msg["role"] != "system"]
+    kwargs = {"model": model, "messages": messages, "max_tokens": 4096, "stream": True}
+    if system_message:
+        kwargs["system"] = system_message
+    start = clock()
+    first_token_at = None
+    prompt_tokens = None
+    completion_tokens = 0
+    for event in anthropic_client.messages.create(**kwargs):
+        if event.type == "message_start":
+            prompt_tokens = event.message.usage.input_tokens
+        elif event.type == "content_block_delta":
+            if first_token_at is None:
+                first_token_at = clock()
+        elif event.type == "message_delta":
+            completion_tokens = event.usage.output_tokens
+    end = clock()
+    return {
+        "start": start,
+        "first_token_at": first_token_at,
+        "end": end,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+    }
+
+
+def percentiles(values):
+    values = np.asarray([v for v in values if v is not None], dtype=np.float64)
+    if len(values) == 0:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"mean": float(values.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def summarize(samples, wall_seconds, concurrency):
+    ttft = [s["first_token_at"] - s["start"] if s["first_token_at"] else None for s in samples]
+    total = [s["end"] - s["start"] for s in samples]
+    # デコード速度: 最初のトークン以降に生成されたトークン数 / 経過時間
+    tokens_per_sec = [
+        s["completion_tokens"] / (s["end"] - s["first_token_at"])
+        if s["first_token_at"] and s["end"] > s["first_token_at"]
+        else None
+        for s in samples
+    ]
+    prompt_tokens = sum(s["prompt_tokens"] or 0 for s in samples)
+    completion_tokens = sum(s["completion_tokens"] or 0 for s in samples)
+    return {
+        "requests": len(samples),
+        "concurrency": concurrency,
+        "wall_seconds": wall_seconds,
+        "requests_per_sec": len(samples) / wall_seconds if wall_seconds else None,
+        "ttft_seconds": percentiles(ttft),
+        "total_seconds": percentiles(total),
+        "tokens_per_sec": percentiles(tokens_per_sec),
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class LatencyBenchmark:
+    """Streams the same prompts through each model and reports TTFT, total latency and decode speed."""
+
+    def __init__(self, client, anthropic_client=None, concurrency=4, clock=time.perf_counter):
+        self.client = client
+        self.anthropic_client = anthropic_client
+        self.concurrency = concurrency
+        self.clock = clock
+
+    def stream(self, model, messages):
+        if model.startswith("claude"):
+            return stream_anthropic(self.anthropic_client, model, messages, self.clock)
+        return stream_openai(self.client, model, messages, self.clock)
+
+    def run_model(self, model, messages_list):
+        start = self.clock()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            samples = list(executor.map(lambda messages: self.stream(model, messages), messages_list))
+        return summarize(samples, self.clock() - start, self.concurrency)
+
+    def run(self, models, messages_list):
+        results = {}
+        for model in models:
+            results[model] = self.run_model(model, messages_list)
+            ttft = results[model]["ttft_seconds"] or {}
+            total = results[model]["total_seconds"] or {}
+            print(
+                f"Model: {model}, TTFT p50/p95: {ttft.get('p50', 0):.3f}/{ttft.get('p95', 0):.3f}s, "
+                f"total p50/p95: {total.get('p50', 0):.3f}/{total.get('p95', 0):.3f}s"
+            )
+        return results
+
+
+def merge_latency_into_results(results_file, latency):
+    """Add `latency` per model into a results JSON written by EvaluationRunner.write_results_to_json."""
+    with open(results_file, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    by_model = {model: data for model, data in results}
+    for model, summary in latency.items():
+        if model not in by_model:
+            by_model[model] = {"scores": [], "avg": None, "data": []}
+            results.append([model, by_model[model]])
+        by_model[model]["latency"] = summary
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Latency results merged into {results_file}")
@@ -0,0 +1,186 @@
+import os
+
+import numpy as np
+
+from src.lib.dataset.ledger import text_hash
+from src.lib.store.experiments import default_store
+
+RESULTS_DIR = "config/results"
+
+
+def pair_id(en):
+    return text_hash(en)
+
+
+class RunResults:
+    """Per-pair scores of one evaluation run as columns sorted by (model, pair id, epoch)."""
+
+    def __init__(self, run, dataset, models, model, pair, epoch, score, pair_ids, pair_texts):
+        self.run = run
+        self.dataset = dataset
+        self.models = list(models)
+        self.model = model
+        self.pair = pair
+        self.epoch = epoch
+        self.score = score
+        self.pair_ids = pair_ids
+        self.pair_texts = pair_texts
+
+    @classmethod
+    def from_records(cls, run, dataset, records, pair_texts):
+        """`records` are (model, pair id, epoch, score); `pair_texts` maps pair id to its English text."""
+        models = sorted({record[0] for record in records})
+        model_codes = {model: i for i, model in enumerate(models)}
+        model = np.fromiter((model_codes[r[0]] for r in records), dtype=np.int32, count=len(records))
+        pair = np.fromiter((r[1] for r in records), dtype=np.uint64, count=len(records))
+        epoch = np.fromiter((r[2] for r in records), dtype=np.int16, count=len(records))
+        score = np.fromiter((r[3] for r in records), dtype=np.float32, count=len(records))
+        order = np.lexsort((epoch, pair, model))
+        pair_ids = np.fromiter(pair_texts.keys(), dtype=np.uint64, count=len(pair_texts))
+        texts = np.array(list(pair_texts.values()), dtype=str)
+        text_order = np.argsort(pair_ids)
+        return cls(
+            run, dataset, models, model[order], pair[order], epoch[order], score[order],
+            pair_ids[text_order], texts[text_order],
+        )
+
+    def __len__(self):
+        return len(self.score)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            run=np.array(self.run),
+            dataset=np.array(self.dataset or ""),
+            models=np.array(self.models, dtype=str),
+            model=self.model,
+            pair=self.pair,
+            epoch=self.epoch,
+            score=self.score,
+            pair_ids=self.pair_ids,
+            pair_texts=self.pair_texts,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                str(data["run"]), str(data["dataset"]), data["models"].tolist(), data["model"],
+                data["pair"], data["epoch"], data["score"], data["pair_ids"], data["pair_texts"],
+            )
+
+    def model_rows(self, model):
+        """Slice of the (sorted) columns belonging to `model`."""
+        if model not in self.models:
+            raise KeyError(f"{model} is not in run {self.run} (models: {', '.join(self.models)})")
+        code = self.models.index(model)
+        lo, hi = np.searchsorted(self.model, [code, code + 1])
+        return slice(lo, hi)
+
+    def pair_means(self, model):
+        """Unique pair ids of `model` and their score averaged over epochs."""
+        rows = self.model_rows(model)
+        pairs, inverse = np.unique(self.pair[rows], return_inverse=True)
+        sums = np.bincount(inverse, weights=self.score[rows].astype(np.float64), minlength=len(pairs))
+        counts = np.bincount(inverse, minlength=len(pairs))
+        return pairs, sums / counts
+
+    def texts_for(self, pair_ids):
+        if len(self.pair_ids) == 0:
+            return np.full(len(pair_ids), "")
+        index = np.searchsorted(self.pair_ids, pair_ids)
+        index = np.minimum(index, len(self.pair_ids) - 1)
+        found = self.pair_ids[index] == pair_ids
+        return np.where(found, self.pair_texts[index], "")
+
+
+class PairComparison:
+    """Per-pair score deltas between two (run, model) selections, joined on pair id."""
+
+    def __init__(self, old, old_model, new, new_model, threshold=0.05):
+        old_pairs, old_scores = old.pair_means(old_model)
+        new_pairs, new_scores = new.pair_means(new_model)
+        self.pair, old_index, new_index = np.intersect1d(
+            old_pairs, new_pairs, assume_unique=True, return_indices=True
+        )
+        self.old_model = old_model
+        self.new_model = new_model
+        self.old = old_scores[old_index]
+        self.new = new_scores[new_index]
+        self.delta = self.new - self.old
+        self.threshold = threshold
+        self.regressed = self.delta < -threshold
+        self.improved = self.delta > threshold
+        self.only_old = len(old_pairs) - len(self.pair)
+        self.only_new = len(new_pairs) - len(self.pair)
+        self.texts = new.texts_for(self.pair)
+
+    def summary(self):
+        n = len(self.delta)
+        mean = float(self.delta.mean()) if n else 0.0
+        # 対応のある差の標準誤差。平均の低下が 2 標準誤差を超えたら回帰とみなす
+        stderr = float(self.delta.std(ddof=1) / np.sqrt(n)) if n > 1 else 0.0
+        return {
+            "old_model": self.old_model,
+            "new_model": self.new_model,
+            "pairs": n,
+            "only_old": self.only_old,
+            "only_new": self.only_new,
+            "old_mean": float(self.old.mean()) if n else 0.0,
+            "new_mean": float(self.new.mean()) if n else 0.0,
+            "mean_delta": mean,
+            "stderr": stderr,
+            "regressed": int(self.regressed.sum()),
+            "improved": int(self.improved.sum()),
+            "regression": bool(n > 1 and mean < 0 and -mean > 2 * stderr),
+        }
+
+    def worst(self, k=10):
+        order = np.argsort(self.delta)[:k]
+        return [
+            {
+                "pair_id": int(self.pair[i]),
+                "en": str(self.texts[i]),
+                "old": float(self.old[i]),
+                "new": float(self.new[i]),
+                "delta": float(self.delta[i]),
+            }
+            for i in order
+            if self.delta[i] < 0
+        ]
+
+
+class ResultsStore:
+    """Compressed columnar result files under `root`, indexed in the experiment store."""
+
+    def __init__(self, root=RESULTS_DIR, store=None):
+        self.root = root
+        self.store = store or default_store()
+
+    def save(self, run, dataset, output_file, records, pair_texts):
+        os.makedirs(self.root, exist_ok=True)
+        results = RunResults.from_records(run, dataset, records, pair_texts)
+        path = os.path.join(self.root, f"{run}.npz")
+        results.save(path)
+        self.store.record_result_run(run, dataset, output_file, path, len(results))
+        return path
+
+    def runs(self, model=None, dataset=None):
+        return self.store.find_result_runs(model, dataset)
+
+    def resolve(self, run, model=None, dataset=None):
+        """Run id, or "latest" / "previous" among the stored runs that evaluated `model`."""
+        if run not in ("latest", "previous"):
+            return run
+        runs = list(dict.fromkeys(row["run"] for row in self.runs(model, dataset)))
+        needed = 1 if run == "latest" else 2
+        if len(runs) < needed:
+            raise ValueError(f"no {run} run found for model={model} dataset={dataset}")
+        return runs[-needed]
+
+    def load(self, run):
+        rows = self.store.query("SELECT results_path FROM result_runs WHERE run = ?", (run,))
+        path = rows[0]["results_path"] if rows else os.path.join(self.root, f"{run}.npz")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No stored results for run '{run}'.")
+        return RunResults.load(path)
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.lib.finetune.fake_api import fake_embedding
+
+
+class StubOpenAIServer:
+    """Local HTTP server speaking enough of the OpenAI API for chat (incl. streaming) and embeddings.
+
+    `delays` maps model name to (seconds before the first token, seconds per token). The
+    reply is the user prompt split into `tokens` whitespace-separated pieces.
+
+        with StubOpenAIServer({"ft:x": (0.2, 0.01)}) as server:
+            client = OpenAI(base_url=server.base_url, api_key="stub")
+    """
+
+    def __init__(self, delays=None, default_delay=(0.0, 0.0), tokens=20, port=0):
+        self.delays = delays or {}
+        self.default_delay = default_delay
+        self.tokens = tokens
+        self.requests = []
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.make_handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reply_pieces(self, messages):
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        words = prompt.split() or ["..."]
+        return [words[i % len(words)] + " " for i in range(self.tokens)]
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests.append((self.path, body))
+                if self.path.endswith("/chat/completions"):
+                    self.chat(body)
+                elif self.path.endswith("/embeddings"):
+                    texts = [body["input"]] if isinstance(body["input"], str) else body["input"]
+                    n_tokens = sum(len(t) for t in texts)
+                    self.send_json({
+                        "object": "list",
+                        "model": body["model"],
+                        "data": [
+                            {"object": "embedding", "index": i, "embedding": fake_embedding(t)}
+                            for i, t in enumerate(texts)
+                        ],
+                        "usage": {"prompt_tokens": n_tokens, "total_tokens": n_tokens},
+                    })
+                else:
+                    self.send_error(404)
+
+            def chat(self, body):
+                model = body["model"]
+                first_delay, token_delay = server.delays.get(model, server.default_delay)
+                pieces = server.reply_pieces(body["messages"])
+                prompt_tokens = sum(len(m["content"].split()) for m in body["messages"])
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(pieces),
+                    "total_tokens": prompt_tokens + len(pieces),
+                }
+                base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": model}
+                time.sleep(first_delay)
+                if not body.get("stream"):
+                    time.sleep(token_delay * len(pieces))
+                    self.send_json({
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [{
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": "".join(pieces)},
+                        }],
+                        "usage": usage,
+                    })
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(token_delay)
+                    self.send_event({
+                        **base,
+                        "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                    })
+                self.send_event({
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                })
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    self.send_event({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def send_event(self, payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
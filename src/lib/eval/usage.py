@@ -0,0 +1,174 @@
+import threading
+from collections import defaultdict
+
+import tiktoken
+
+from prep_and_analisys_dataset import num_tokens_from_messages
+
+# 100万トークンあたりの USD 単価（入力, 出力）。設定の "prices" で上書き・追加できる
+DEFAULT_PRICES = {
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "ft:gpt-4o-mini": {"input": 0.30, "output": 1.20},
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "ft:gpt-4o": {"input": 3.75, "output": 15.00},
+    "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
+    "ft:gpt-3.5-turbo": {"input": 3.00, "output": 6.00},
+    "text-embedding-3-large": {"input": 0.13, "output": 0.0},
+    "text-embedding-3-small": {"input": 0.02, "output": 0.0},
+    "claude-3-5-sonnet": {"input": 3.00, "output": 15.00},
+    "claude-3-5-haiku": {"input": 0.80, "output": 4.00},
+    "claude-3-opus": {"input": 15.00, "output": 75.00},
+    "claude-3-haiku": {"input": 0.25, "output": 1.25},
+}
+
+
+def provider_for(model):
+    return "anthropic" if model.startswith("claude") else "openai"
+
+
+def response_tokens(response):
+    """(input tokens, output tokens) from an OpenAI or Anthropic response, (0, 0) without usage."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    if hasattr(usage, "input_tokens"):
+        return usage.input_tokens or 0, usage.output_tokens or 0
+    return usage.prompt_tokens or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+class PriceTable:
+    """Per-million-token prices looked up by the longest matching model name prefix.
+
+    A fine-tuned model "ft:gpt-4o-mini-2024-07-18:org:suffix:id" matches "ft:gpt-4o-mini"
+    before falling back to the base model's price.
+    """
+
+    def __init__(self, prices=None):
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+        self._cache = {}
+
+    def lookup(self, model):
+        if model not in self._cache:
+            candidates = [model]
+            if model.startswith("ft:"):
+                candidates.append(model.split(":")[1])
+            price = None
+            for name in candidates:
+                matches = [key for key in self.prices if name.startswith(key)]
+                if matches:
+                    price = self.prices[max(matches, key=len)]
+                    break
+            self._cache[model] = price
+        return self._cache[model]
+
+    def cost(self, model, input_tokens, output_tokens):
+        price = self.lookup(model)
+        if price is None:
+            return 0.0
+        return (input_tokens * price["input"] + output_tokens * price.get("output", 0.0)) / 1_000_000
+
+
+def encoding_for(model):
+    """tiktoken encoding for `model`, or None if none can be loaded (e.g. offline without a cache)."""
+    try:
+        return tiktoken.encoding_for_model(model.split(":")[1] if model.startswith("ft:") else model)
+    except Exception:
+        # Claude などの tiktoken が知らないモデルや、o200k_base を取得できない場合は cl100k_base で近似する
+        pass
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+class UsageTracker:
+    """Token and cost totals per (model, provider, stage), with an optional hard budget in USD.
+
+    Embedding calls are attributed to the model whose output they score, but priced as
+    the embedding model. Once `spent` reaches `budget`, `exhausted` turns True and the
+    caller stops scheduling requests.
+    """
+
+    def __init__(self, prices=None, budget=None, metrics=None):
+        self.prices = PriceTable(prices)
+        self.budget = budget
+        self.metrics = metrics
+        self.spent = 0.0
+        self.unpriced = set()
+        # (model, provider, stage) -> [requests, input tokens, output tokens, cost]
+        self.totals = defaultdict(lambda: [0, 0, 0, 0.0])
+        self.lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        return self.budget is not None and self.spent >= self.budget
+
+    def record(self, model, stage, response, priced_as=None):
+        input_tokens, output_tokens = response_tokens(response)
+        priced_as = priced_as or model
+        if self.prices.lookup(priced_as) is None:
+            self.unpriced.add(priced_as)
+        cost = self.prices.cost(priced_as, input_tokens, output_tokens)
+        provider = provider_for(priced_as)
+        with self.lock:
+            totals = self.totals[(model, provider, stage)]
+            totals[0] += 1
+            totals[1] += input_tokens
+            totals[2] += output_tokens
+            totals[3] += cost
+            self.spent += cost
+        if self.metrics is not None:
+            labels = {"model": model, "provider": provider, "stage": stage}
+            self.metrics.inc("evaluation_input_tokens_total", input_tokens, **labels)
+            self.metrics.inc("evaluation_output_tokens_total", output_tokens, **labels)
+            self.metrics.inc("evaluation_cost_usd_total", cost, **labels)
+        return cost
+
+    def estimate(self, models, target_pairs, epochs, make_messages, embedding_model):
+        """Pre-flight cost estimate from tiktoken counts, before any request is sent.
+
+        Output tokens are assumed to be as many as the reference translation; each pair
+        is scored with two embeddings (reference and candidate). Returns None when no
+        tiktoken encoding can be loaded.
+        """
+        estimate = {}
+        encodings = {model: encoding_for(model) for model in [embedding_model, *models]}
+        if any(encoding is None for encoding in encodings.values()):
+            return None
+        embedding_encoding = encodings[embedding_model]
+        reference_tokens = [len(embedding_encoding.encode(pair["ja"])) for pair in target_pairs]
+        embedding_cost = self.prices.cost(embedding_model, 2 * sum(reference_tokens), 0)
+        for model in models:
+            encoding = encodings[model]
+            input_tokens = sum(
+                num_tokens_from_messages(encoding, make_messages(pair["en"], model)) for pair in target_pairs
+            )
+            output_tokens = sum(len(encoding.encode(pair["ja"])) for pair in target_pairs)
+            completion_cost = self.prices.cost(model, input_tokens, output_tokens)
+            estimate[model] = {
+                "input_tokens": input_tokens * epochs,
+                "output_tokens": output_tokens * epochs,
+                "cost_usd": (completion_cost + embedding_cost) * epochs,
+                "priced": self.prices.lookup(model) is not None,
+            }
+        return estimate
+
+    def summary(self):
+        by_model = defaultdict(lambda: {"requests": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "stages": {}})
+        by_provider = defaultdict(lambda: {"requests": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0})
+        for (model, provider, stage), (requests, input_tokens, output_tokens, cost) in sorted(self.totals.items()):
+            row = {"requests": requests, "input_tokens": input_tokens, "output_tokens": output_tokens, "cost_usd": cost}
+            by_model[model]["stages"][stage] = row
+            for total in (by_model[model], by_provider[provider]):
+                total["requests"] += requests
+                total["input_tokens"] += input_tokens
+                total["output_tokens"] += output_tokens
+                total["cost_usd"] += cost
+        return {
+            "total_cost_usd": self.spent,
+            "budget_usd": self.budget,
+            "budget_exhausted": self.exhausted,
+            "unpriced_models": sorted(self.unpriced),
+            "models": dict(by_model),
+            "providers": dict(by_provider),
+        }
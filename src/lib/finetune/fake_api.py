@@ -0,0 +1,196 @@
+import hashlib
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class FakeClock:
+    """Manually advanced clock; pass `time` and `sleep` to code under test."""
+
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+class FakeFiles:
+    def __init__(self, api):
+        self.api = api
+        self.uploaded = {}
+
+    def create(self, file, purpose):
+        file_id = f"file-{next(self.api.ids)}"
+        self.uploaded[file_id] = file.read()
+        return SimpleNamespace(id=file_id, bytes=len(self.uploaded[file_id]), purpose=purpose)
+
+
+class FakeUploadParts:
+    def __init__(self, uploads):
+        self.uploads = uploads
+
+    def create(self, upload_id, data):
+        uploads = self.uploads
+        with uploads.lock:
+            if uploads.fail_after_parts is not None and uploads.part_calls >= uploads.fail_after_parts:
+                raise ConnectionError("simulated interruption")
+            uploads.part_calls += 1
+            part_id = f"part-{next(uploads.api.ids)}"
+        uploads.pending[upload_id]["parts"][part_id] = bytes(data)
+        return SimpleNamespace(id=part_id, upload_id=upload_id)
+
+
+class FakeUploads:
+    def __init__(self, api):
+        self.api = api
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.part_calls = 0
+        # この回数のパート送信後に接続断を発生させる（None なら発生させない）
+        self.fail_after_parts = None
+        self.parts = FakeUploadParts(self)
+
+    def create(self, bytes, filename, mime_type, purpose):
+        upload_id = f"upload-{next(self.api.ids)}"
+        self.pending[upload_id] = {"bytes": bytes, "filename": filename, "purpose": purpose, "parts": {}}
+        return SimpleNamespace(id=upload_id, status="pending")
+
+    def complete(self, upload_id, part_ids):
+        upload = self.pending.pop(upload_id)
+        data = b"".join(upload["parts"][part_id] for part_id in part_ids)
+        if len(data) != upload["bytes"]:
+            raise ValueError("uploaded parts do not add up to the declared size")
+        file_id = f"file-{next(self.api.ids)}"
+        self.api.files.uploaded[file_id] = data
+        return SimpleNamespace(id=upload_id, status="completed", file=SimpleNamespace(id=file_id))
+
+
+class FakeJobs:
+    def __init__(self, api):
+        self.api = api
+        self.created = {}
+
+    def create(self, training_file, model, suffix=None, hyperparameters=None, validation_file=None):
+        job_id = f"ftjob-{next(self.api.ids)}"
+        self.created[job_id] = {
+            "training_file": training_file,
+            "validation_file": validation_file,
+            "model": model,
+            "suffix": suffix,
+            "hyperparameters": hyperparameters or {},
+            "created_at": int(self.api.clock.time()),
+        }
+        return self.retrieve(job_id)
+
+    def retrieve(self, job_id):
+        job = self.created[job_id]
+        api = self.api
+        elapsed = api.clock.time() - job["created_at"]
+        running_at = api.validating_seconds + api.queued_seconds
+        finish_at = running_at + api.running_seconds
+        estimated_finish = None
+        fine_tuned_model = None
+        trained_tokens = None
+        if elapsed < api.validating_seconds:
+            status = "validating_files"
+        elif elapsed < running_at:
+            status = "queued"
+        elif elapsed < finish_at:
+            status = "running"
+            estimated_finish = job["created_at"] + finish_at
+        elif job["suffix"] in api.failing_suffixes:
+            status = "failed"
+        else:
+            status = "succeeded"
+            fine_tuned_model = f"ft:{job['model']}:fake-org:{job['suffix']}:{job_id[-6:]}"
+            trained_tokens = api.trained_tokens
+        api.retrieve_calls += 1
+        return SimpleNamespace(
+            id=job_id,
+            status=status,
+            created_at=job["created_at"],
+            estimated_finish=estimated_finish,
+            fine_tuned_model=fine_tuned_model,
+            trained_tokens=trained_tokens,
+        )
+
+
+def fake_embedding(text, dim=64):
+    # 文字 bigram のハッシュを数えるだけの決定的な埋め込み（似た文字列ほど類似度が高い）
+    vector = np.zeros(dim, dtype=np.float32)
+    for i in range(max(1, len(text) - 1)):
+        bucket = int.from_bytes(hashlib.md5(text[i : i + 2].encode("utf-8")).digest()[:4], "little")
+        vector[bucket % dim] += 1.0
+    return vector.tolist()
+
+
+class FakeChatCompletions:
+    def __init__(self, api):
+        self.api = api
+
+    def create(self, model, messages, **kwargs):
+        if self.api.latency:
+            time.sleep(self.api.latency)
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        text = self.api.translate(model, prompt)
+        prompt_tokens = sum(len(m["content"]) for m in messages)
+        return SimpleNamespace(
+            id=f"chatcmpl-{next(self.api.ids)}",
+            model=model,
+            choices=[SimpleNamespace(index=0, finish_reason="stop", message=SimpleNamespace(role="assistant", content=text))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=len(text),
+                total_tokens=prompt_tokens + len(text),
+            ),
+        )
+
+
+class FakeEmbeddings:
+    def __init__(self, api):
+        self.api = api
+
+    def create(self, input, model):
+        if self.api.latency:
+            time.sleep(self.api.latency)
+        texts = [input] if isinstance(input, str) else list(input)
+        n_tokens = sum(len(text) for text in texts)
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(index=i, embedding=fake_embedding(text)) for i, text in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=n_tokens, total_tokens=n_tokens),
+        )
+
+
+class FakeOpenAI:
+    """In-process stand-in for the OpenAI client (files, uploads, fine-tuning, chat, embeddings).
+
+    Jobs move validating_files -> queued -> running -> succeeded (or failed for
+    `failing_suffixes`) as `clock` advances. Chat completions echo the prompt through
+    `translate`, and every chat/embedding call sleeps for `latency` real seconds.
+    """
+
+    def __init__(self, clock=None, validating_seconds=30, queued_seconds=60,
+                 running_seconds=1800, trained_tokens=12345, failing_suffixes=(),
+                 latency=0.0, translate=None):
+        self.clock = clock or FakeClock()
+        self.validating_seconds = validating_seconds
+        self.queued_seconds = queued_seconds
+        self.running_seconds = running_seconds
+        self.trained_tokens = trained_tokens
+        self.failing_suffixes = set(failing_suffixes)
+        self.latency = latency
+        self.translate = translate or (lambda model, prompt: prompt)
+        self.retrieve_calls = 0
+        self.ids = (f"{n:06d}" for n in itertools.count(1))
+        self.files = FakeFiles(self)
+        self.uploads = FakeUploads(self)
+        self.fine_tuning = SimpleNamespace(jobs=FakeJobs(self))
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(self))
+        self.embeddings = FakeEmbeddings(self)
@@ -0,0 +1,34 @@
+from src.lib.store.experiments import default_store
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+# upload the data
+def upload_data(client, file_path):
+    with open(file_path, "rb") as f:
+        dataset_file = client.files.create(file=f, purpose="fine-tune")
+    return dataset_file.id
+
+
+# create the fine-tune model
+def create_fine_tune_job(client, dataset_file_id, model, suffix, epochs=None, validation_file_id=None):
+    kwargs = {"training_file": dataset_file_id, "model": model, "suffix": suffix}
+    if validation_file_id:
+        kwargs["validation_file"] = validation_file_id
+    if epochs:
+        kwargs["hyperparameters"] = {"n_epochs": epochs}
+    return client.fine_tuning.jobs.create(**kwargs)
+
+
+def load_config(config_file_path):
+    return default_store().load_config(config_file_path)
+
+
+def save_config(config, config_file_path, replace=False):
+    """Write `config` merged into the file; `replace=True` overwrites it, for explicit user edits only."""
+    default_store().update_config(config_file_path, config, replace=replace)
+
+
+def update_config(config_file_path, updates):
+    """Merge `updates` into the config on disk, keeping keys written by others meanwhile."""
+    return default_store().update_config(config_file_path, updates)
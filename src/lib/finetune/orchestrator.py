@@ -0,0 +1,131 @@
+import heapq
+import itertools
+import time
+from collections import deque
+from datetime import datetime
+
+from src.lib.finetune.jobs import TERMINAL_STATUSES, update_config
+from src.lib.store.experiments import default_store
+
+
+def format_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class TrackedJob:
+    def __init__(self, config_path, job_id):
+        self.config_path = config_path
+        self.job_id = job_id
+        self.status = None
+        self.result = None
+
+
+class FineTuneOrchestrator:
+    """Polls many fine-tuning jobs from one loop, each on its own adaptive schedule.
+
+    Jobs far from their `estimated_finish` are polled rarely; jobs about to finish, or
+    still validating files, are polled often. Every observed change is merged into the
+    job's config file and the experiment store atomically. Jobs added with `enqueue` are only submitted while fewer
+    than `max_active_jobs` tracked jobs are unfinished.
+    """
+
+    def __init__(self, client, min_interval=10, max_interval=600, clock=time.time,
+                 sleep=time.sleep, max_active_jobs=None):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.max_active_jobs = max_active_jobs
+        self.jobs = []
+        self._schedule = []
+        self._queue = deque()
+        self._counter = itertools.count()
+
+    def track(self, config_path, job_id):
+        job = TrackedJob(config_path, job_id)
+        self.jobs.append(job)
+        self._push(job, self.clock())
+        return job
+
+    def enqueue(self, config_path, submit):
+        """Queue a job; `submit()` creates it when a slot is free and returns its job id."""
+        self._queue.append((config_path, submit))
+
+    def _fill(self):
+        while self._queue and (
+            self.max_active_jobs is None or len(self._schedule) < self.max_active_jobs
+        ):
+            config_path, submit = self._queue.popleft()
+            job_id = submit()
+            print(f"Submitted {job_id} for {config_path} ({len(self._queue)} queued)")
+            self.track(config_path, job_id)
+
+    def _push(self, job, when):
+        heapq.heappush(self._schedule, (when, next(self._counter), job))
+
+    def poll_interval(self, status, estimated_finish=None):
+        if status == "validating_files":
+            interval = self.min_interval
+        elif status == "queued":
+            interval = self.min_interval * 6
+        elif status == "running" and estimated_finish:
+            # 残り時間の半分ずつ間隔を詰めていく
+            interval = (estimated_finish - self.clock()) / 2
+        else:
+            interval = self.min_interval * 6
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def record(self, job, state):
+        updates = {"ft_status": state.status}
+        if state.created_at:
+            updates["ft_created_at"] = format_timestamp(state.created_at)
+        if state.estimated_finish:
+            updates["ft_estimated_finish"] = format_timestamp(state.estimated_finish)
+        if state.status == "succeeded":
+            updates["ft_model"] = state.fine_tuned_model
+            updates["used_tokens"] = state.trained_tokens
+        update_config(job.config_path, updates)
+        default_store().record_job(
+            job.job_id,
+            job.config_path,
+            status=state.status,
+            ft_model=state.fine_tuned_model,
+            trained_tokens=state.trained_tokens,
+        )
+
+    def poll(self, job):
+        state = self.client.fine_tuning.jobs.retrieve(job.job_id)
+        if state.status != job.status:
+            print(f"{job.job_id} ({job.config_path}): {state.status}")
+            self.record(job, state)
+            job.status = state.status
+        if state.status in TERMINAL_STATUSES:
+            job.result = state
+            if state.status == "succeeded":
+                print(f"{job.job_id}: {state.fine_tuned_model} ({state.trained_tokens} tokens)")
+            return None
+        return self.poll_interval(state.status, state.estimated_finish)
+
+    def run(self, timeout=None):
+        """Poll until every tracked job reaches a terminal status (or `timeout` seconds pass)."""
+        deadline = None if timeout is None else self.clock() + timeout
+        self._fill()
+        while self._schedule:
+            when, _, job = heapq.heappop(self._schedule)
+            if deadline is not None and when > deadline:
+                heapq.heappush(self._schedule, (when, next(self._counter), job))
+                print(
+                    f"Timed out with {len(self._schedule)} job(s) still running "
+                    f"and {len(self._queue)} queued."
+                )
+                break
+            wait = when - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+            interval = self.poll(job)
+            if interval is not None:
+                self._push(job, self.clock() + interval)
+            else:
+                self._fill()
+        return {job.config_path: job.result for job in self.jobs}
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.lib.finetune.jobs import upload_data
+from src.lib.store.experiments import default_store
+
+REGISTRY_PATH = "config/upload_registry.json"
+# Uploads API の 1 パートの上限は 64 MB
+PART_SIZE = 64 * 1024 * 1024
+# 未完了の Upload は作成から 1 時間で失効する
+UPLOAD_EXPIRY_SECONDS = 3600
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadRegistry:
+    """File SHA-256 to uploaded file id, plus resume state of multipart uploads, kept in the experiment store.
+
+    Every change is its own store transaction, so parallel sweeps never overwrite each
+    other's pending uploads.
+    """
+
+    def __init__(self, path=REGISTRY_PATH, store=None):
+        self.path = path
+        self.store = store or default_store()
+        if os.path.exists(path):
+            self.migrate()
+
+    def migrate(self):
+        # 以前の形式で JSON に保存されていたアップロード済みファイルと再開情報を移行し、JSON は削除する
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for sha256, entry in data.get("files", {}).items():
+            self.store.record_upload(
+                sha256, entry["file_id"], entry.get("path"), entry.get("bytes"),
+                entry.get("purpose", "fine-tune"),
+            )
+        for sha256, state in data.get("pending", {}).items():
+            self.store.start_pending_upload(
+                sha256, state["upload_id"], state["part_size"], state["created_at"],
+                state.get("parts"), replace=False,
+            )
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            # 別のプロセスが先に移行した
+            pass
+
+    def get(self, sha256, purpose="fine-tune"):
+        return self.store.get_upload(sha256, purpose)
+
+    def record(self, sha256, file_id, file_path, size, purpose="fine-tune"):
+        self.store.record_upload(sha256, file_id, file_path, size, purpose)
+
+    def pending(self, sha256):
+        return self.store.get_pending_upload(sha256)
+
+    def start_pending(self, sha256, upload_id, part_size, created_at):
+        self.store.start_pending_upload(sha256, upload_id, part_size, created_at)
+        return {"upload_id": upload_id, "part_size": part_size, "created_at": created_at, "parts": {}}
+
+    def record_part(self, upload_id, part_number, part_id):
+        self.store.record_upload_part(upload_id, part_number, part_id)
+
+
+def read_part(file_path, part_number, part_size):
+    with open(file_path, "rb") as f:
+        f.seek(part_number * part_size)
+        return f.read(part_size)
+
+
+def multipart_upload(client, file_path, sha256, size, registry, purpose="fine-tune",
+                     part_size=PART_SIZE, max_workers=4, clock=time.time):
+    state = registry.pending(sha256)
+    if (
+        state is None
+        or state["part_size"] != part_size
+        or clock() - state["created_at"] > UPLOAD_EXPIRY_SECONDS
+    ):
+        upload = client.uploads.create(
+            bytes=size,
+            filename=os.path.basename(file_path),
+            mime_type="text/jsonl",
+            purpose=purpose,
+        )
+        state = registry.start_pending(sha256, upload.id, part_size, clock())
+    else:
+        print(f"Resuming upload {state['upload_id']} ({len(state['parts'])} parts done)")
+
+    upload_id = state["upload_id"]
+    parts = dict(state["parts"])
+    n_parts = max(1, -(-size // part_size))
+    remaining = [n for n in range(n_parts) if str(n) not in parts]
+
+    def send(part_number):
+        # 各パートはワーカーごとにファイルから読み出すので、メモリに載るのは同時実行数分だけ
+        data = read_part(file_path, part_number, part_size)
+        part = client.uploads.parts.create(upload_id, data=data)
+        registry.record_part(upload_id, part_number, part.id)
+        parts[str(part_number)] = part.id
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(send, n) for n in remaining]
+        for future in as_completed(futures):
+            future.result()
+
+    part_ids = [parts[str(n)] for n in range(n_parts)]
+    upload = client.uploads.complete(upload_id, part_ids=part_ids)
+    return upload.file.id
+
+
+def upload_file(client, file_path, registry=None, purpose="fine-tune",
+                part_size=PART_SIZE, max_workers=4):
+    """Upload `file_path` unless identical bytes were uploaded before. Returns the file id."""
+    if registry is None:
+        registry = UploadRegistry()
+    sha256 = file_sha256(file_path)
+    file_id = registry.get(sha256, purpose)
+    if file_id:
+        print(f"Reusing uploaded file {file_id} for {file_path}")
+        return file_id
+
+    size = os.path.getsize(file_path)
+    if size <= part_size:
+        file_id = upload_data(client, file_path)
+    else:
+        file_id = multipart_upload(
+            client, file_path, sha256, size, registry, purpose, part_size, max_workers
+        )
+    registry.record(sha256, file_id, file_path, size, purpose)
+    return file_id
@@ -0,0 +1,166 @@
+import bisect
+import json
+import time
+from collections import defaultdict
+
+# 100µs から約 100 秒までの指数バケット（秒）
+DEFAULT_BUCKETS = tuple(1e-4 * 2 ** i for i in range(21))
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=None):
+    items = list(key) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile."""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Counters and latency histograms keyed by name and labels, exportable as JSON or Prometheus text."""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        self.counters[(name, label_key(labels))] += value
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, label_key(labels)), 0)
+
+    def histogram(self, name, **labels):
+        key = (name, label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def timer(self, name, **labels):
+        return Timer(self.histogram(name, **labels))
+
+    def to_dict(self):
+        counters = defaultdict(dict)
+        for (name, key), value in self.counters.items():
+            counters[name][format_labels(key) or "total"] = value
+        histograms = defaultdict(dict)
+        for (name, key), histogram in self.histograms.items():
+            histograms[name][format_labels(key) or "total"] = histogram.to_dict()
+        return {
+            "elapsed_seconds": time.time() - self.started_at,
+            "counters": dict(counters),
+            "histograms": dict(histograms),
+        }
+
+    def to_prometheus(self):
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (n, key), value in sorted(self.counters.items()):
+                if n == name:
+                    lines.append(f"{name}{format_labels(key)} {value}")
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (n, key), histogram in sorted(self.histograms.items(), key=lambda x: x[0]):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(key, [('le', f'{bound:g}')])} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(key, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{format_labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path_prefix):
+        """Write `<path_prefix>.json` and `<path_prefix>.prom`."""
+        with open(f"{path_prefix}.json", "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        with open(f"{path_prefix}.prom", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        print(f"Metrics written to {path_prefix}.json and {path_prefix}.prom")
+
+
+class ProgressReporter:
+    """Prints at most one progress line every `interval` seconds."""
+
+    def __init__(self, interval=5.0, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self.started_at = clock()
+        self.last_report = self.started_at
+
+    def maybe_report(self, message_fn, force=False):
+        now = self.clock()
+        if not force and now - self.last_report < self.interval:
+            return False
+        self.last_report = now
+        print(message_fn(now - self.started_at))
+        return True
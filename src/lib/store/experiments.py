@@ -0,0 +1,350 @@
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+
+STORE_PATH = "config/experiments.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS configs (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    dataset TEXT,
+    base_model TEXT,
+    ft_model TEXT,
+    dataset_file_id TEXT,
+    fine_job_id TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS configs_dataset ON configs (dataset);
+CREATE INDEX IF NOT EXISTS configs_base_model ON configs (base_model);
+CREATE INDEX IF NOT EXISTS configs_ft_model ON configs (ft_model);
+
+CREATE TABLE IF NOT EXISTS datasets (
+    path TEXT PRIMARY KEY,
+    config_path TEXT,
+    source TEXT,
+    rows INTEGER,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS datasets_source ON datasets (source);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    sha256 TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    path TEXT,
+    bytes INTEGER,
+    uploaded_at TEXT NOT NULL,
+    PRIMARY KEY (sha256, purpose)
+);
+
+CREATE TABLE IF NOT EXISTS pending_uploads (
+    sha256 TEXT PRIMARY KEY,
+    upload_id TEXT NOT NULL,
+    part_size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS upload_parts (
+    upload_id TEXT NOT NULL,
+    part_number INTEGER NOT NULL,
+    part_id TEXT NOT NULL,
+    PRIMARY KEY (upload_id, part_number)
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    config_path TEXT,
+    training_file TEXT,
+    base_model TEXT,
+    suffix TEXT,
+    epochs INTEGER,
+    status TEXT,
+    ft_model TEXT,
+    trained_tokens INTEGER,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_config_path ON jobs (config_path);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_ft_model ON jobs (ft_model);
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dataset TEXT,
+    avg_score REAL,
+    n_scores INTEGER,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evaluations_model ON evaluations (model);
+CREATE INDEX IF NOT EXISTS evaluations_dataset ON evaluations (dataset);
+CREATE INDEX IF NOT EXISTS evaluations_run ON evaluations (run);
+
+CREATE TABLE IF NOT EXISTS result_runs (
+    run TEXT PRIMARY KEY,
+    dataset TEXT,
+    output_file TEXT,
+    results_path TEXT NOT NULL,
+    n_rows INTEGER,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS result_runs_dataset ON result_runs (dataset);
+"""
+
+INDEXED_CONFIG_KEYS = ("dataset", "base_model", "ft_model", "dataset_file_id", "fine_job_id")
+
+
+def now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def write_json_atomic(data, file_path):
+    # 一時ファイルに書いてから置き換えるため、途中で落ちてもファイルは壊れない
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            json.dump(data, tmp_file, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@lru_cache(maxsize=None)
+def default_store(path=STORE_PATH):
+    return ExperimentStore(path)
+
+
+class ExperimentStore:
+    """SQLite index of configs, datasets, uploads, jobs, evaluation scores and result runs.
+
+    Config JSON files stay the user-editable view. Every write re-reads the file, merges
+    the update and rewrites both the file and the indexed row inside one write
+    transaction, so concurrent runs serialise instead of overwriting each other.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self.connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def query(self, sql, params=()):
+        conn = self.connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    # configs
+
+    def _upsert_config(self, conn, config_path, config):
+        conn.execute(
+            """INSERT INTO configs (path, name, data, dataset, base_model, ft_model,
+                                    dataset_file_id, fine_job_id, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET
+                 data = excluded.data, dataset = excluded.dataset,
+                 base_model = excluded.base_model, ft_model = excluded.ft_model,
+                 dataset_file_id = excluded.dataset_file_id,
+                 fine_job_id = excluded.fine_job_id, updated_at = excluded.updated_at""",
+            (
+                os.path.normpath(config_path),
+                os.path.splitext(os.path.basename(config_path))[0],
+                json.dumps(config, ensure_ascii=False),
+                *(str(config[key]) if config.get(key) is not None else None for key in INDEXED_CONFIG_KEYS),
+                now(),
+            ),
+        )
+
+    def load_config(self, config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        with self.transaction() as conn:
+            self._upsert_config(conn, config_path, config)
+        return config
+
+    def update_config(self, config_path, updates, replace=False):
+        """Merge `updates` into the config file and its row atomically. Returns the merged config.
+
+        With `replace=True` the file is overwritten with `updates` instead of merged.
+        """
+        with self.transaction() as conn:
+            config = {}
+            if not replace and os.path.exists(config_path):
+                with open(config_path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            config.update(updates)
+            write_json_atomic(config, config_path)
+            self._upsert_config(conn, config_path, config)
+        return config
+
+    def find_configs(self, **filters):
+        """Configs whose indexed columns match, e.g. find_configs(dataset="yhavinga/ccmatrix")."""
+        unknown = set(filters) - set(INDEXED_CONFIG_KEYS)
+        if unknown:
+            raise ValueError(f"not indexed config keys: {sorted(unknown)}")
+        where = " AND ".join(f"{key} = ?" for key in filters) or "1"
+        rows = self.query(
+            f"SELECT path, name, data, updated_at FROM configs WHERE {where} ORDER BY updated_at",
+            tuple(filters.values()),
+        )
+        for row in rows:
+            row["data"] = json.loads(row["data"])
+        return rows
+
+    # datasets
+
+    def record_dataset(self, dataset_path, config_path, source, rows):
+        with self.transaction() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO datasets (path, config_path, source, rows, created_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (os.path.normpath(dataset_path), os.path.normpath(config_path), source, rows, now()),
+            )
+
+    # uploads
+
+    def get_upload(self, sha256, purpose="fine-tune"):
+        rows = self.query(
+            "SELECT file_id FROM uploads WHERE sha256 = ? AND purpose = ?", (sha256, purpose)
+        )
+        return rows[0]["file_id"] if rows else None
+
+    def record_upload(self, sha256, file_id, file_path, size, purpose="fine-tune"):
+        with self.transaction() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO uploads (sha256, purpose, file_id, path, bytes, uploaded_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (sha256, purpose, file_id, file_path, size, now()),
+            )
+            self._delete_pending_upload(conn, sha256)
+
+    def get_pending_upload(self, sha256):
+        """Resume state of an unfinished multipart upload: upload_id, part_size, created_at and parts."""
+        rows = self.query(
+            "SELECT upload_id, part_size, created_at FROM pending_uploads WHERE sha256 = ?", (sha256,)
+        )
+        if not rows:
+            return None
+        state = rows[0]
+        parts = self.query(
+            "SELECT part_number, part_id FROM upload_parts WHERE upload_id = ?", (state["upload_id"],)
+        )
+        state["parts"] = {str(row["part_number"]): row["part_id"] for row in parts}
+        return state
+
+    def start_pending_upload(self, sha256, upload_id, part_size, created_at, parts=None, replace=True):
+        """Record a new multipart upload for `sha256`, dropping the parts of any previous one."""
+        with self.transaction() as conn:
+            if not replace and conn.execute(
+                "SELECT 1 FROM pending_uploads WHERE sha256 = ?", (sha256,)
+            ).fetchone():
+                return
+            self._delete_pending_upload(conn, sha256)
+            conn.execute(
+                "INSERT INTO pending_uploads (sha256, upload_id, part_size, created_at) VALUES (?, ?, ?, ?)",
+                (sha256, upload_id, part_size, created_at),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO upload_parts (upload_id, part_number, part_id) VALUES (?, ?, ?)",
+                [(upload_id, int(number), part_id) for number, part_id in (parts or {}).items()],
+            )
+
+    def record_upload_part(self, upload_id, part_number, part_id):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO upload_parts (upload_id, part_number, part_id) VALUES (?, ?, ?)",
+                (upload_id, part_number, part_id),
+            )
+
+    def _delete_pending_upload(self, conn, sha256):
+        conn.execute(
+            "DELETE FROM upload_parts WHERE upload_id IN (SELECT upload_id FROM pending_uploads WHERE sha256 = ?)",
+            (sha256,),
+        )
+        conn.execute("DELETE FROM pending_uploads WHERE sha256 = ?", (sha256,))
+
+    # jobs
+
+    def record_job(self, job_id, config_path=None, **fields):
+        columns = ["config_path"] + list(fields)
+        values = [os.path.normpath(config_path) if config_path else None] + list(fields.values())
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, updated_at) VALUES (?, ?)", (job_id, now())
+            )
+            assignments = ", ".join(
+                f"{column} = COALESCE(?, {column})" for column in columns
+            )
+            conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+                (*values, now(), job_id),
+            )
+
+    # evaluations
+
+    def record_result_run(self, run, dataset, output_file, results_path, n_rows):
+        with self.transaction() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO result_runs (run, dataset, output_file, results_path, n_rows, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (run, dataset, output_file, results_path, n_rows, now()),
+            )
+
+    def find_result_runs(self, model=None, dataset=None):
+        """Stored result runs, oldest first, with one row per model evaluated in the run."""
+        where, params = [], []
+        if model:
+            where.append("e.model = ?")
+            params.append(model)
+        if dataset:
+            where.append("r.dataset = ?")
+            params.append(dataset)
+        return self.query(
+            """SELECT r.run, r.dataset, r.results_path, r.created_at, e.model, e.avg_score, e.n_scores
+               FROM result_runs r JOIN evaluations e ON e.run = r.run
+               WHERE """ + (" AND ".join(where) or "1") + " ORDER BY r.created_at, r.run, e.model",
+            tuple(params),
+        )
+
+    def record_evaluation(self, run, dataset, model_scores):
+        """`model_scores` maps model name to its list of similarity scores."""
+        created_at = now()
+        with self.transaction() as conn:
+            conn.executemany(
+                """INSERT INTO evaluations (run, model, dataset, avg_score, n_scores, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [
+                    (run, model, dataset, sum(scores) / len(scores) if scores else None, len(scores), created_at)
+                    for model, scores in model_scores.items()
+                ],
+            )
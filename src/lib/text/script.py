@@ -0,0 +1,74 @@
+import numpy as np
+
+OTHER, HIRAGANA, KATAKANA, KANJI, LATIN, DIGIT, PUNCTUATION, SPACE = range(8)
+CLASS_NAMES = ("other", "hiragana", "katakana", "kanji", "latin", "digit", "punctuation", "space")
+N_CLASSES = len(CLASS_NAMES)
+
+
+def build_table():
+    table = np.zeros(0x110000, dtype=np.uint8)
+
+    def assign(cls, *ranges):
+        for first, last in ranges:
+            table[first : last + 1] = cls
+
+    assign(PUNCTUATION, (0x21, 0x2F), (0x3A, 0x40), (0x5B, 0x60), (0x7B, 0x7E),
+           (0xA1, 0xBF), (0x2010, 0x205E), (0x3001, 0x303F), (0xFF01, 0xFF0F),
+           (0xFF1A, 0xFF20), (0xFF3B, 0xFF40), (0xFF5B, 0xFF65), (0x30FB, 0x30FB))
+    assign(LATIN, (0x41, 0x5A), (0x61, 0x7A), (0xC0, 0x24F), (0xFF21, 0xFF3A), (0xFF41, 0xFF5A))
+    assign(PUNCTUATION, (0xD7, 0xD7), (0xF7, 0xF7))
+    assign(DIGIT, (0x30, 0x39), (0xFF10, 0xFF19))
+    assign(HIRAGANA, (0x3041, 0x309F))
+    # 長音符「ー」・半角カタカナ（ｰ を含む）もカタカナとして数える
+    assign(KATAKANA, (0x30A0, 0x30FA), (0x30FC, 0x30FF), (0x31F0, 0x31FF), (0xFF66, 0xFF9F))
+    # 々〆〇 は漢字扱い
+    assign(KANJI, (0x3005, 0x3007), (0x3400, 0x4DBF), (0x4E00, 0x9FFF),
+           (0xF900, 0xFAFF), (0x20000, 0x2FFFF))
+    assign(SPACE, (0x09, 0x0D), (0x20, 0x20), (0x85, 0x85), (0xA0, 0xA0),
+           (0x2000, 0x200B), (0x3000, 0x3000))
+    return table
+
+
+SCRIPT_TABLE = build_table()
+
+
+class ScriptStats:
+    """Per-text character class counts for a batch of texts."""
+
+    def __init__(self, counts, lengths):
+        self.counts = counts
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def count(self, *classes):
+        return self.counts[:, list(classes)].sum(axis=1)
+
+    def ratio(self, *classes):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.lengths > 0, self.count(*classes) / self.lengths, 0.0)
+
+    def japanese_ratio(self):
+        return self.ratio(HIRAGANA, KATAKANA, KANJI)
+
+    def kana_ratio(self):
+        return self.ratio(HIRAGANA, KATAKANA)
+
+    def latin_ratio(self):
+        return self.ratio(LATIN)
+
+    def ratios(self):
+        return {name: self.ratio(cls) for cls, name in enumerate(CLASS_NAMES)}
+
+
+def classify_scripts(texts):
+    """Count character classes for every text in one pass over a UTF-32 codepoint array."""
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    codepoints = np.frombuffer("".join(texts).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    classes = SCRIPT_TABLE[codepoints]
+    segments = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    counts = np.bincount(
+        segments * N_CLASSES + classes, minlength=len(texts) * N_CLASSES
+    ).reshape(len(texts), N_CLASSES)
+    return ScriptStats(counts, lengths)
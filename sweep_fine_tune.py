@@ -0,0 +1,123 @@
+import argparse
+import itertools
+import json
+import os
+import time
+
+from openai import OpenAI
+
+from create_fine_tune_model import submit_job
+from evaluate_fine_tune_model_v2 import Config, EvaluationRunner
+from src.lib.finetune.jobs import load_config, save_config
+from src.lib.finetune.orchestrator import FineTuneOrchestrator
+from src.lib.finetune.uploads import UploadRegistry
+
+GRID_KEYS = ("datasets", "base_model", "n_epochs", "suffix")
+
+
+def as_list(value):
+    if value is None:
+        return [None]
+    return value if isinstance(value, list) else [value]
+
+
+def validation_file_for(dataset):
+    # create_dataset.py が同じディレクトリに書き出した検証データがあれば使う
+    if not dataset.endswith("_dataset.jsonl"):
+        return None
+    validation_file = dataset[: -len("_dataset.jsonl")] + "_validation_dataset.jsonl"
+    return validation_file if os.path.exists(validation_file) else None
+
+
+def expand_grid(sweep_config):
+    """One job config per point of datasets x base_model x n_epochs x suffix."""
+    shared = {k: v for k, v in sweep_config.items() if k not in GRID_KEYS and k != "evaluation"}
+    points = []
+    for dataset, base_model, n_epochs, suffix in itertools.product(
+        *(as_list(sweep_config.get(key)) for key in GRID_KEYS)
+    ):
+        if not dataset or not base_model or not suffix:
+            raise ValueError("datasets, base_model and suffix must be set in the sweep config.")
+        point = dict(shared)
+        point.update(
+            {"ft_dataset_file": dataset, "base_model": base_model, "suffix": suffix, "epochs": n_epochs}
+        )
+        validation_file = validation_file_for(dataset)
+        if validation_file:
+            point["ft_validation_file"] = validation_file
+        points.append(point)
+    return points
+
+
+def run_sweep(sweep_config, output_dir, client, anthropic_client=None, registry=None,
+              clock=time.time, sleep=time.sleep):
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.basename(os.path.normpath(output_dir))
+    registry = registry or UploadRegistry()
+    orchestrator = FineTuneOrchestrator(
+        client,
+        min_interval=sweep_config.get("min_interval", 10),
+        max_interval=sweep_config.get("max_interval", 600),
+        clock=clock,
+        sleep=sleep,
+        max_active_jobs=sweep_config.get("max_concurrent_jobs", 3),
+    )
+
+    config_paths = []
+    for i, point in enumerate(expand_grid(sweep_config)):
+        config_path = f"{output_dir}/{name}_{i:03d}.json"
+        if os.path.exists(config_path):
+            # 再実行時は既存のジョブ ID などを引き継ぐ
+            point = {**point, **load_config(config_path)}
+        save_config(point, config_path)
+        config_paths.append(config_path)
+        orchestrator.enqueue(
+            config_path,
+            lambda path=config_path, dataset=point["ft_dataset_file"]: submit_job(
+                client, path, dataset, registry
+            ),
+        )
+    print(f"Sweep {name}: {len(config_paths)} jobs, up to {orchestrator.max_active_jobs} at a time")
+
+    results = orchestrator.run()
+    models = [
+        result.fine_tuned_model
+        for path in config_paths
+        if (result := results.get(path)) is not None and result.status == "succeeded"
+    ]
+    print(f"{len(models)} of {len(config_paths)} jobs succeeded")
+
+    evaluation = sweep_config.get("evaluation")
+    if not evaluation or not models:
+        return models
+    eval_config = {
+        "system": sweep_config.get("system"),
+        "user": sweep_config.get("user"),
+        "output_file": f"{output_dir}/{name}_evaluation.json",
+        **evaluation,
+    }
+    eval_config["models"] = models + evaluation.get("models", [])
+    runner = EvaluationRunner(Config.from_dict(eval_config), client, anthropic_client)
+    runner.run()
+    return models
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a grid of fine-tuning jobs and evaluate them")
+    parser.add_argument("sweep_config", help="Path to the sweep config JSON file")
+    parser.add_argument(
+        "--max-concurrent", type=int, default=None, help="Override max_concurrent_jobs"
+    )
+    args = parser.parse_args()
+
+    # スイープ定義はジョブの設定ではないので、実験ストアの configs には登録しない
+    with open(args.sweep_config, "r", encoding="utf-8") as f:
+        sweep_config = json.load(f)
+    if args.max_concurrent:
+        sweep_config["max_concurrent_jobs"] = args.max_concurrent
+    name = os.path.splitext(os.path.basename(args.sweep_config))[0]
+    run_sweep(sweep_config, f"config/{name}", OpenAI())
+
+
+if __name__ == "__main__":
+    main()